@@ -1,6 +1,7 @@
 from .job import Job
 from .manager import Manager
 from .scheduler import Scheduler
+from .engine import AsyncScheduler
 
 __author__ = 'Timur Faradzhov'
 __copyright__ = 'Copyright 2019, The Pypyrus Runner Project'
@@ -0,0 +1,215 @@
+"""
+Benchmarks of the scheduler hot paths.
+Run with python -m pypyrus_runner.benchmark and compare JSON outputs between
+versions.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from .parser import parse_schedule, parse_rows, parse_meta
+from .launcher import Process, Launcher
+from .scheduler import Scheduler
+from .timetable import Timetable
+from .watcher import Watcher
+
+from . import __version__
+
+# Values of time units used in generated schedules.
+PATTERNS = {
+    'month_day': ('*', '*', '*', '1', '1-15', '1,11,21', '/2'),
+    'week_day': ('*', '*', '*', '1-5', '6,7', '1'),
+    'hour': ('*', '*', '/1', '8', '0-6', '/4'),
+    'minute': ('*', '0', '/5', '/15', '30', '0-29'),
+    'second': ('0', '0', '/10', '*', '30', '/15'),
+}
+HEADER = [
+    'ID', 'NAME', 'DESCRIPTION', 'ENVIRONMENT', 'FILE',
+    'MONTH_DAY', 'WEEK_DAY', 'HOUR', 'MINUTE', 'SECOND',
+    'PARAMETERS', 'STATUS'
+]
+
+def generate_schedule(path, rows, file='job.py', seed=0):
+    """Write the synthetic schedule with mixed time units."""
+    generator = random.Random(seed)
+    with open(path, 'w') as schedule:
+        schedule.write('\t'.join(HEADER) + '\n')
+        for id in range(rows):
+            units = [
+                generator.choice(PATTERNS[unit])
+                for unit in PATTERNS]
+            status = 'Y' if generator.random() < 0.9 else 'N'
+            row = [
+                str(id), f'job_{id:03}', f'Job {id}', 'python', file,
+                *units, '', status]
+            schedule.write('\t'.join(row) + '\n')
+    pass
+
+def measure(function, number=1, repeat=5):
+    """Get the best time of one call in seconds."""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            function()
+        spent = (time.perf_counter() - start) / number
+        best = spent if best is None else min(best, spent)
+    return best
+
+def bench_schedule(folder, rows):
+    """Measure schedule parsing, scanning and reloading."""
+    path = os.path.join(folder, f'schedule_{rows}.tsv')
+    generate_schedule(path, rows)
+    results = {}
+    results['parse_schedule'] = measure(lambda: parse_schedule(path), 1, 3)
+    results['parse_rows'] = measure(lambda: parse_rows(path), 1, 3)
+    header, table = parse_rows(path)
+    results['compile_schedule'] = measure(
+        lambda: Timetable(header, table), 1, 3)
+    timetable = Timetable(header, table)
+
+    # Scan of one moment as it is done by _scan_schedule.
+    moments = [time.localtime(time.time() + i) for i in range(60)]
+    results['_scan_schedule'] = measure(
+        lambda: [list(timetable.scan(moment)) for moment in moments],
+        1, 5) / len(moments)
+
+    # Check of the unmodified schedule as it is done by _check_schedule and
+    # update of one modified row.
+    watcher = Watcher(path)
+    results['_check_schedule'] = measure(watcher.check, 100, 5)
+    watcher.close()
+    key = next(iter(table))
+    changed = dict(table)
+    edits = [
+        changed[key].replace('\tY', '\tN'), changed[key].replace('\tN', '\tY')]
+    def update():
+        for edit in edits:
+            changed[key] = edit
+            timetable.update(header, changed)
+    results['update_one_row'] = measure(update, 1, 5) / len(edits)
+    return results
+
+def bench_units():
+    """Measure check of one time unit as it is done by _check_time."""
+    units = ['*', '5', '/5', '1-5', '1,3,5']
+    calls = [(unit, base) for unit in units for base in range(60)]
+    def check():
+        for unit, base in calls:
+            Scheduler._check_time(None, unit, base)
+    return {'_check_time': measure(check, 1, 5) / len(calls)}
+
+def bench_spawn(folder, number=20):
+    """Measure spawn latency of the no-op job."""
+    path = os.path.join(folder, 'noop.py')
+    with open(path, 'w') as noop:
+        noop.write('pass\n')
+    launcher = Launcher()
+    latencies = []
+    for i in range(number):
+        process = launcher.launch(Process(sys.executable, path))
+        while True:
+            results = launcher.collect()
+            if len(results) > 0:
+                break
+            time.sleep(0.001)
+        if process.error is not None:
+            raise process.error
+        latencies.append(process.latency)
+        if process.popen is not None:
+            process.popen.wait()
+        else:
+            os.waitpid(process.pid, 0)
+    latencies.sort()
+    return {
+        'spawn_latency_p50': latencies[len(latencies) // 2],
+        'spawn_latency_max': latencies[-1]
+    }
+
+def bench_job(folder, rows):
+    """Measure startup of the built-in job with and without metadata."""
+    root = os.path.join(folder, f'runner_{rows}')
+    job_folder = os.path.join(root, 'jobs', '0')
+    os.makedirs(job_folder, exist_ok=True)
+    job_path = os.path.join(job_folder, 'job.py')
+    with open(job_path, 'w') as job:
+        job.write('import pypyrus_runner as runner\n')
+        job.write('job = runner.Job()\n')
+    schedule_path = os.path.join(root, 'schedule.tsv')
+    generate_schedule(schedule_path, rows, file=job_path)
+    config = Scheduler.parse_config(
+        main=os.path.join(root, 'config.ini'), save=False)
+    config['SCHEDULER']['schedule'] = schedule_path
+    with open(os.path.join(root, 'config.ini'), 'w') as config_file:
+        config.write(config_file)
+
+    header, table = parse_rows(schedule_path)
+    record = dict(zip(header, table['0'].split('\t')))
+    env = {**os.environ, **parse_meta(record, config)}
+    command = [sys.executable, job_path]
+    return {
+        'job_startup': measure(
+            lambda: subprocess.run(command, check=True), 1, 3),
+        'job_startup_with_meta': measure(
+            lambda: subprocess.run(command, env=env, check=True), 1, 3)
+    }
+
+def run(sizes, spawn=True, job=True):
+    """Run all benchmarks and get the report."""
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': []
+    }
+    def add(name, rows, seconds):
+        report['results'].append(
+            {'name': name, 'rows': rows, 'seconds': seconds})
+    with tempfile.TemporaryDirectory() as folder:
+        for name, seconds in bench_units().items():
+            add(name, None, seconds)
+        if spawn is True:
+            for name, seconds in bench_spawn(folder).items():
+                add(name, None, seconds)
+        for rows in sizes:
+            for name, seconds in bench_schedule(folder, rows).items():
+                add(name, rows, seconds)
+            if job is True:
+                for name, seconds in bench_job(folder, rows).items():
+                    add(name, rows, seconds)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m pypyrus_runner.benchmark',
+        description='Measure the scheduler hot paths.')
+    parser.add_argument(
+        '-r', '--rows', default='100,1000,10000,100000',
+        help='Comma separated sizes of generated schedules.')
+    parser.add_argument(
+        '-o', '--output', help='Path to JSON file. Default is stdout.')
+    parser.add_argument(
+        '--no-spawn', action='store_true', help='Skip spawn latency.')
+    parser.add_argument(
+        '--no-job', action='store_true', help='Skip job startup.')
+    arguments = parser.parse_args()
+    sizes = [int(size) for size in arguments.rows.split(',')]
+    report = run(
+        sizes, spawn=not arguments.no_spawn, job=not arguments.no_job)
+    output = json.dumps(report, indent=2)
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+    pass
+
+if __name__ == '__main__':
+    main()
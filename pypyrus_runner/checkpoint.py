@@ -0,0 +1,35 @@
+import os
+
+class Checkpoint():
+    """
+    Class describing the file with the last completed scheduler moment.
+    Moment is overwritten in place on each step, so saving it costs one
+    write to the open file.
+    """
+    # Size of the record. Moment is padded to it.
+    size = 20
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.__fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        pass
+
+    def read(self):
+        """Get the saved moment or None if there is nothing."""
+        os.lseek(self.__fd, 0, os.SEEK_SET)
+        data = os.read(self.__fd, self.size).strip()
+        try:
+            return int(data)
+        except ValueError:
+            return None
+
+    def write(self, moment):
+        """Save the moment."""
+        os.lseek(self.__fd, 0, os.SEEK_SET)
+        os.write(self.__fd, f'{int(moment):<{self.size - 1}}\n'.encode())
+        pass
+
+    def close(self):
+        """Close the file."""
+        os.close(self.__fd)
+        pass
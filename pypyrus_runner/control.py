@@ -0,0 +1,142 @@
+import os
+import json
+import queue
+import socket
+import threading
+import socketserver
+
+def send(path, command, timeout=10.0, **arguments):
+    """
+    Send the command to the scheduler by its control socket and get the
+    answer. Raises OSError if the scheduler is not running.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(timeout)
+        client.connect(path)
+        message = {'command': command, **arguments}
+        client.sendall(json.dumps(message).encode() + b'\n')
+        with client.makefile('rb') as file:
+            line = file.readline()
+    finally:
+        client.close()
+    if not line:
+        raise ConnectionError('no answer from the scheduler.')
+    return json.loads(line)
+
+class Request():
+    """Class describing the request waiting for the answer of scheduler."""
+    def __init__(self, message):
+        self.message = message
+        self.answer = None
+        self.event = threading.Event()
+        pass
+
+    def reply(self, answer):
+        """Give the answer to the client."""
+        self.answer = answer
+        self.event.set()
+        pass
+
+class Control():
+    """
+    Class describing the control socket of the scheduler.
+    Requests are read in the separate thread and wait in the queue until
+    the scheduler answers them in its own loop, so the state of scheduler
+    is never changed from other threads. Descriptor of the control becomes
+    readable when there are requests, so the scheduler can sleep waiting
+    for it. Given event is set too to wake the scheduler waiting for it.
+    """
+    # Seconds the client waits for the scheduler.
+    timeout = 10.0
+
+    def __init__(self, path, event=None):
+        self.path = os.path.abspath(path)
+        self.event = event
+        self.requests = queue.Queue()
+        self.__read, self.__write = os.pipe()
+        os.set_blocking(self.__read, False)
+        if os.path.exists(self.path) is True:
+            # Socket is left by the stopped scheduler or used by running one.
+            # Only the socket nobody listens to is removed. Scheduler that
+            # is too busy to answer still owns its socket.
+            try:
+                send(self.path, 'status', timeout=1.0)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if os.path.exists(self.path) is True:
+                    os.remove(self.path)
+            except (OSError, ValueError):
+                raise OSError(f'control socket {self.path} is in use.')
+            else:
+                raise OSError(f'control socket {self.path} is in use.')
+        handler = type('Handler', (Handler,), {'control': self})
+        self.server = UnixServer(self.path, handler)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name='control', daemon=True)
+        self.thread.start()
+        pass
+
+    @property
+    def fd(self):
+        """Descriptor that becomes readable when there are requests."""
+        return self.__read
+
+    def put(self, request):
+        """Put the request to the queue and wake the scheduler."""
+        self.requests.put(request)
+        os.write(self.__write, b'\0')
+        if self.event is not None:
+            self.event.set()
+        pass
+
+    def collect(self):
+        """Get all requests received since the last call."""
+        try:
+            while os.read(self.__read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        requests = []
+        while True:
+            try:
+                requests.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return requests
+
+    def close(self):
+        """Stop serving and remove the socket."""
+        self.server.shutdown()
+        self.server.server_close()
+        os.close(self.__read)
+        os.close(self.__write)
+        if os.path.exists(self.path) is True:
+            os.remove(self.path)
+        pass
+
+class Handler(socketserver.StreamRequestHandler):
+    """Class describing the handler of control requests."""
+    control = None
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            message = json.loads(line)
+        except ValueError as error:
+            answer = {'ok': False, 'error': f'incorrect request: {error}'}
+        else:
+            request = Request(message)
+            self.control.put(request)
+            if request.event.wait(self.control.timeout) is True:
+                answer = request.answer
+            else:
+                answer = {'ok': False, 'error': 'scheduler is busy.'}
+        self.wfile.write(json.dumps(answer, default=str).encode() + b'\n')
+        pass
+
+# Unix sockets are not available on Windows.
+if hasattr(socketserver, 'UnixStreamServer') is True:
+    class UnixServer(
+        socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+    ):
+        daemon_threads = True
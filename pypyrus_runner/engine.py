@@ -0,0 +1,252 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+import subprocess
+
+from .parser import parse_command, parse_meta
+from .registry import Run, wait
+from .scheduler import Scheduler
+
+class AsyncScheduler(Scheduler):
+    """
+    Scheduler working in the asyncio loop.
+    Moments are planned on the monotonic loop clock, jobs are launched and
+    awaited concurrently and the schedule is reloaded in the background, so
+    no slow step delays the next moment.
+    """
+    # Processes are awaited by the loop itself.
+    reaper = False
+    # Jobs are launched by the loop, so warm workers are not started.
+    warm = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        # Real time in milliseconds and loop time of the first moment after
+        # synchronization and number of steps passed since it.
+        self.__base_moment = None
+        self.__base_time = None
+        self.__count = 0
+        # Background reload of the schedule.
+        self.__reload = None
+        # Launch of jobs waiting for the spawn rate.
+        self.__throttle = None
+        pass
+
+    @property
+    def moment(self):
+        """Current scheduler moment"""
+        return (self.__base_moment + self.__count * self.resolution) / 1000
+
+    def start(self):
+        """Launch the scheduler."""
+        self.log.head()
+        self.log.info('%s STARTED.' % self.desc)
+        self._serve_metrics()
+        self._serve_control()
+        asyncio.run(self._main())
+        pass
+
+    async def _main(self):
+        """Plan the first moment and run forever."""
+        self.loop = asyncio.get_running_loop()
+        # Control requests are answered as soon as they come.
+        if self.control is not None:
+            self.loop.add_reader(self.control.fd, self._check_control)
+        # First scheduler moment.
+        self._sync_time()
+        # Find runs missed since the last start.
+        if self.checkpoint is not None:
+            last = self.checkpoint.read()
+            if last is not None:
+                self._catch_up(last + 1, int(self.moment))
+        self.loop.call_at(self.__base_time, self._process)
+        await self.loop.create_future()
+        pass
+
+    def _sync_time(self):
+        """Set current scheduler moment to the next start of the step."""
+        self.log.info('SYNCHRONIZING THE TIME...')
+        now = time.time_ns()
+        moment = -(-now // 1000000 // self.resolution) * self.resolution
+        self.__base_moment = moment
+        self.__base_time = self.loop.time() + (moment * 1000000 - now) / 1e9
+        self.__count = 0
+        self.log.ok()
+        pass
+
+    def _process(self):
+        """
+        Basic scheduler process.
+        All actions that must be done during one scheduler step.
+        """
+        due = self.__base_time + self.__count * self.resolution / 1000
+        delay = self.loop.time() - due
+        self.metrics.lag.observe(delay)
+        # Log current moment if it is needed.
+        if self.showtime == True:
+            self.log.info('')
+
+        # Check that schedule was not modified.
+        self._check_schedule()
+        # Find jobs that must be launched at current moment.
+        start = time.perf_counter()
+        slots = list(self._scan_schedule())
+        self.metrics.scan.observe(time.perf_counter() - start)
+        for i in slots:
+            self._due(i)
+        self._check_delayed(self.moment)
+        self._save_moment(self.moment)
+        # Stop runs that crossed their limits.
+        if len(self.limited) > 0:
+            self._check_limits()
+        # Launch missed runs once per second.
+        if len(self.backlog) > 0 and self.__count % self.timetable.steps == 0:
+            self._check_backlog()
+        self._throttle()
+
+        if self.showdelay is True:
+            self.log.info(f'DELAY: {delay:0.5f}')
+        # Plan the next moment. System time that does not follow the loop
+        # clock is noticed here.
+        drift = time.time() - self.moment - delay
+        if delay > 1 or abs(drift) >= 1:
+            self.log.warning('TIME IS BROKEN!')
+            last = self.moment
+            self._sync_time()
+            self._catch_up(int(last) + 1, int(self.moment))
+        else:
+            if abs(drift) >= 0.001:
+                # Small corrections of the system time move next steps.
+                self.__base_time -= drift
+            self.__count += 1
+        due = self.__base_time + self.__count * self.resolution / 1000
+        self.loop.call_at(due, self._process)
+        pass
+
+    def _throttle(self):
+        """
+        Plan the launch of jobs waiting for the spawn rate or deferred by
+        the load of the host.
+        """
+        delay = self.pool.delay()
+        if self.__throttle is None and delay > 0:
+            self.__throttle = self.loop.call_later(delay, self._release)
+        pass
+
+    def _release(self):
+        """Launch jobs that waited for the spawn rate or the load."""
+        self.__throttle = None
+        self._check_pool()
+        self._throttle()
+        pass
+
+    def _check_schedule(self):
+        """Check if schedule was modified in the background."""
+        if self.__reload is None:
+            self.__reload = self.loop.run_in_executor(
+                None, self._reload_schedule)
+            self.__reload.add_done_callback(self._update_schedule)
+        pass
+
+    def _reload_schedule(self):
+        """Read the schedule if it was modified."""
+        if self.watcher.check() is True:
+            return time.perf_counter(), self.store.read()
+        return None
+
+    def _update_schedule(self, future):
+        """Apply changes of the reloaded schedule."""
+        self.__reload = None
+        try:
+            result = future.result()
+            if result is not None:
+                start, rows = result
+                touched = self.timetable.update(*rows)
+                self.metrics.reload.observe(time.perf_counter() - start)
+        except (OSError, ValueError, sqlite3.Error) as error:
+            # Schedule may be written at the moment. Try again later.
+            self.log.warning(f'Schedule NOT UPDATED: {error}')
+            self.watcher.retry()
+        except BaseException:
+            self.log.error()
+        else:
+            if result is not None:
+                self.log.info(
+                    f'Schedule UPDATED. Jobs changed: {len(touched)}.')
+        pass
+
+    def _launch(self, job):
+        """Create the task for the job and occupy the slot in the pool."""
+        task = self.loop.create_task(self._execute(job))
+        self.pool.take(task, job['environment'])
+        self.metrics.launched.inc()
+        pass
+
+    async def _execute(self, job):
+        """Run the job process and wait until it is finished."""
+        task = asyncio.current_task()
+        try:
+            id = job['id']
+            file = job['file']
+            parameters = job['parameters']
+            environment = job['environment']
+            parameters += ' -a'
+            self.log.info(f'CREATING SUBPROCESS FOR JOB {id}')
+            executor = self.config['ENVIRONMENT'].get(environment)
+            # Job will run as separate process.
+            command = parse_command(executor, file, parameters)
+            env = parse_meta(self._describe(job), self.config)
+            # Limits of resources are applied in the child.
+            limits = job['limits']
+            preexec = limits.apply if limits.spawned is True else None
+            requested = time.monotonic()
+            process = subprocess.Popen(
+                command, env={**os.environ, **env}, preexec_fn=preexec)
+        except BaseException:
+            self.metrics.failed.inc()
+            self.log.error()
+            self._resolve(job['id'], job['trigger'], False)
+        else:
+            self.metrics.spawn.observe(time.monotonic() - requested)
+            if job['due'] is not None:
+                self.metrics.start.observe(time.monotonic() - job['due'])
+            self.log.ok()
+            run = Run(id, job['trigger'], process, environment, limits)
+            self.registry.add(run)
+            self._watch(run)
+            exit_code, rusage = await self._exited(process)
+            self.registry.finish(process.pid, exit_code, rusage)
+        finally:
+            self.pool.release(task)
+            # Log finished runs and launch queued jobs.
+            self._check_pool()
+        pass
+
+    def _exited(self, process):
+        """
+        Get the future of the exit code and used resources of the process.
+        Process is reaped here and not by the child watcher of the loop,
+        otherwise its resources are lost.
+        """
+        future = self.loop.create_future()
+        if hasattr(os, 'pidfd_open') is True:
+            fd = os.pidfd_open(process.pid)
+
+            def reap():
+                self.loop.remove_reader(fd)
+                os.close(fd)
+                future.set_result(wait(process.pid))
+            self.loop.add_reader(fd, reap)
+        else:
+            # Without pidfd the process is awaited in the separate thread.
+            def reap():
+                if hasattr(os, 'wait4') is True:
+                    result = wait(process.pid)
+                else:
+                    result = process.wait(), None
+                self.loop.call_soon_threadsafe(future.set_result, result)
+            threading.Thread(target=reap, daemon=True).start()
+        return future
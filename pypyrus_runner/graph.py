@@ -0,0 +1,153 @@
+from .parser import parse_depends
+
+class Graph():
+    """
+    Class describing dependencies between jobs of the schedule.
+    Job with upstream jobs is launched for the trigger as soon as all of
+    them succeeded for the same trigger. Graph is checked when it is built
+    or updated, so the schedule with unknown upstream jobs or with a cycle
+    is rejected as a whole.
+    Graph is updated only by changed jobs and only their part of the graph
+    is checked, so one edit of the large schedule stays cheap.
+    """
+    # Number of changed jobs after which the whole graph is checked at once.
+    rebuild = 64
+
+    def __init__(self, jobs=None):
+        # Ids of upstream and downstream jobs by job ids. Only jobs with
+        # dependencies are here.
+        self.upstreams = {}
+        self.downstreams = {}
+        # Number of jobs by ids and number of jobs referring to each
+        # upstream job by job ids. Schedule can have several jobs with one
+        # id.
+        self.counts = {}
+        self.links = {}
+        self.update(added=jobs or ())
+        pass
+
+    def __len__(self):
+        return len(self.upstreams)
+
+    def update(self, removed=(), added=()):
+        """
+        Replace removed jobs with added ones. Graph is left unchanged if the
+        result is rejected.
+        """
+        touched = self._apply(removed, added)
+        try:
+            if len(touched) > self.rebuild:
+                self._check_all()
+            else:
+                self._check(touched)
+        except ValueError:
+            self._apply(added, removed)
+            raise
+        pass
+
+    def _apply(self, removed, added):
+        """Remove and add jobs. Returns ids of touched jobs."""
+        touched = set()
+        for job in removed:
+            self._count(job, -1)
+            touched.add(job.id)
+        for job in added:
+            self._count(job, 1)
+            touched.add(job.id)
+        return touched
+
+    def _count(self, job, sign):
+        """Add or remove one job and its dependencies."""
+        id = job.id
+        count = self.counts.get(id, 0) + sign
+        if count > 0:
+            self.counts[id] = count
+        else:
+            self.counts.pop(id, None)
+        for upstream in parse_depends(job.depends_on):
+            links = self.links.setdefault(id, {})
+            number = links.get(upstream, 0) + sign
+            if number > 0:
+                links[upstream] = number
+                if number == 1:
+                    self.upstreams.setdefault(id, set()).add(upstream)
+                    self.downstreams.setdefault(upstream, set()).add(id)
+                continue
+            links.pop(upstream, None)
+            if len(links) == 0:
+                self.links.pop(id)
+            self._unlink(self.upstreams, id, upstream)
+            self._unlink(self.downstreams, upstream, id)
+        pass
+
+    @staticmethod
+    def _unlink(edges, id, other):
+        """Remove one edge from the side of the graph."""
+        others = edges.get(id)
+        if others is not None:
+            others.discard(other)
+            if len(others) == 0:
+                edges.pop(id)
+        pass
+
+    def _check(self, touched):
+        """Check dependencies of touched jobs and jobs depending on them."""
+        for id in touched:
+            if id in self.counts:
+                self._check_upstreams(id)
+            else:
+                for downstream in self.downstreams.get(id, ()):
+                    self._check_upstreams(downstream)
+        for id in touched:
+            if id not in self.upstreams:
+                continue
+            # Job is in the cycle if it is its own upstream. Cycle consists
+            # of its upstream jobs that are also its downstream jobs.
+            upstreams = self._reach(self.upstreams, id)
+            if id in upstreams:
+                cycle = upstreams & self._reach(self.downstreams, id)
+                raise ValueError(
+                    'cycle in dependencies of jobs '
+                    f'{", ".join(sorted(cycle))}.')
+        pass
+
+    def _check_upstreams(self, id):
+        """Check that all upstream jobs of the job exist."""
+        unknown = [
+            upstream for upstream in self.upstreams.get(id, ())
+            if upstream not in self.counts]
+        if len(unknown) > 0:
+            raise ValueError(
+                f'job {id} depends on unknown jobs '
+                f'{", ".join(sorted(unknown))}.')
+        pass
+
+    @staticmethod
+    def _reach(edges, id):
+        """Get all jobs reachable from the job by the side of the graph."""
+        found = set()
+        stack = [id]
+        while len(stack) > 0:
+            for other in edges.get(stack.pop(), ()):
+                if other not in found:
+                    found.add(other)
+                    stack.append(other)
+        return found
+
+    def _check_all(self):
+        """Check the whole graph by sorting jobs in order of run."""
+        for id in self.upstreams:
+            self._check_upstreams(id)
+        degrees = {
+            id: len(upstreams) for id, upstreams in self.upstreams.items()}
+        ready = [id for id in self.downstreams if id not in degrees]
+        while len(ready) > 0:
+            for downstream in self.downstreams.get(ready.pop(), ()):
+                degrees[downstream] -= 1
+                if degrees[downstream] == 0:
+                    ready.append(downstream)
+        cycle = [id for id, degree in degrees.items() if degree > 0]
+        if len(cycle) > 0:
+            raise ValueError(
+                f'cycle in dependencies of jobs {", ".join(sorted(cycle))}.')
+        pass
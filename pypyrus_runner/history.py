@@ -0,0 +1,193 @@
+import os
+import math
+import sqlite3
+
+from .parser import parse_trigger
+
+class History():
+    """
+    Class describing the store of job runs.
+    Runs are appended to the SQLite database in WAL mode so writers do not
+    block readers. Each finished run also updates totals of its job and the
+    histogram of its durations in the same transaction, so counts and
+    percentiles are read from a few rows however many runs the job has.
+    Durations in the histogram are grouped in buckets growing by one
+    percent, so percentiles are exact within one percent.
+    Runs stopped by their limits keep the name of the limit.
+    """
+    # Percentiles of duration in statistics.
+    percentiles = (50, 95, 99)
+    # Upper bound of the first bucket of durations in seconds and the ratio
+    # of bounds of neighbouring buckets.
+    minimum = 0.001
+    ratio = 1.01
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        created = self.connection.execute(
+            "SELECT count(*) FROM sqlite_master WHERE name = 'durations'"
+        ).fetchone()[0] == 0
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS runs ('
+                'job TEXT NOT NULL, trigger TEXT, source TEXT, '
+                'pid INTEGER, start_time REAL, end_time REAL, '
+                'duration REAL, exit_code INTEGER, cpu_time REAL, '
+                'max_rss INTEGER, limit_hit TEXT)')
+            # Stores created before limits existed get the new column.
+            columns = [
+                row[1] for row in self.connection.execute(
+                    'PRAGMA table_info(runs)')]
+            if 'limit_hit' not in columns:
+                self.connection.execute(
+                    'ALTER TABLE runs ADD COLUMN limit_hit TEXT')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS runs_duration '
+                'ON runs (job, duration)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS runs_exit_code '
+                'ON runs (job, exit_code)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS runs_limit_hit '
+                'ON runs (job, limit_hit) WHERE limit_hit IS NOT NULL')
+            # Number of finished and failed runs and the histogram of
+            # durations by jobs.
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS totals ('
+                'job TEXT PRIMARY KEY, runs INTEGER, failed INTEGER)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS durations ('
+                'job TEXT, bucket INTEGER, runs INTEGER, '
+                'PRIMARY KEY (job, bucket)) WITHOUT ROWID')
+            # Stores created before the histogram existed fill it once.
+            if created is True:
+                self._count(
+                    self.connection.execute(
+                        'SELECT job, duration, exit_code FROM runs'))
+        pass
+
+    def _count(self, runs):
+        """Add finished runs to totals and histograms of their jobs."""
+        totals = {}
+        buckets = {}
+        for id, duration, exit_code in runs:
+            if exit_code is not None:
+                total = totals.setdefault(id, [0, 0])
+                total[0] += 1
+                total[1] += exit_code != 0
+            if duration is not None:
+                key = (id, self._bucket(duration))
+                buckets[key] = buckets.get(key, 0) + 1
+        self.connection.executemany(
+            'INSERT INTO totals VALUES (?, ?, ?) ON CONFLICT (job) DO UPDATE '
+            'SET runs = runs + excluded.runs, '
+            'failed = failed + excluded.failed',
+            ((id, *total) for id, total in totals.items()))
+        self.connection.executemany(
+            'INSERT INTO durations VALUES (?, ?, ?) '
+            'ON CONFLICT (job, bucket) DO UPDATE '
+            'SET runs = runs + excluded.runs',
+            ((*key, count) for key, count in buckets.items()))
+        pass
+
+    @classmethod
+    def _bucket(cls, duration):
+        """Get the number of the bucket of the duration."""
+        if duration <= cls.minimum:
+            return 0
+        return math.ceil(
+            round(math.log(duration / cls.minimum, cls.ratio), 9))
+
+    @classmethod
+    def _value(cls, bucket):
+        """Get the upper bound of the bucket in seconds."""
+        return cls.minimum * cls.ratio ** bucket
+
+    def add(self, runs, source=None):
+        """Save finished runs in one transaction."""
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                ((
+                    run.id, parse_trigger(run.trigger), source, run.pid,
+                    run.start_time, run.end_time, run.duration,
+                    run.exit_code, run.cpu_time, run.max_rss, run.limit
+                ) for run in runs))
+            self._count(
+                (run.id, run.duration, run.exit_code) for run in runs)
+        pass
+
+    def start(self, id, trigger, start_time, source=None, pid=None):
+        """Save the started run. Returns the number of the run."""
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (job, trigger, source, pid, start_time) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (id, parse_trigger(trigger), source, pid, start_time))
+        return cursor.lastrowid
+
+    def finish(
+        self, number, end_time, exit_code, cpu_time=None, max_rss=None
+    ):
+        """Save results of the started run by its number."""
+        with self.connection:
+            self.connection.execute(
+                'UPDATE runs SET end_time = ?, duration = ? - start_time, '
+                'exit_code = ?, cpu_time = ?, max_rss = ? WHERE rowid = ?',
+                (end_time, end_time, exit_code, cpu_time, max_rss, number))
+            self._count(
+                self.connection.execute(
+                    'SELECT job, duration, exit_code FROM runs '
+                    'WHERE rowid = ?', (number,)))
+        pass
+
+    def stats(self, id):
+        """Get the number of runs, failures and duration percentiles."""
+        execute = self.connection.execute
+        finished, failed = execute(
+            'SELECT runs, failed FROM totals WHERE job = ?',
+            (id,)).fetchone() or (0, 0)
+        hits = execute(
+            'SELECT limit_hit, count(*) FROM runs '
+            'WHERE job = ? AND limit_hit IS NOT NULL GROUP BY limit_hit',
+            (id,)).fetchall()
+        stats = {
+            'runs': finished,
+            'failed': failed,
+            'failure_rate': failed / finished if finished > 0 else None,
+            'limits': dict(hits)
+        }
+        histogram = self._histogram(id)
+        for percentile in self.percentiles:
+            stats[f'p{percentile}'] = self.duration(
+                id, percentile, histogram)
+        return stats
+
+    def duration(self, id, percentile=50, histogram=None):
+        """Get the percentile of duration of the job or None if unknown."""
+        if histogram is None:
+            histogram = self._histogram(id)
+        measured = sum(count for bucket, count in histogram)
+        if measured == 0:
+            return None
+        rank = max(math.ceil(percentile / 100 * measured), 1)
+        passed = 0
+        for bucket, count in histogram:
+            passed += count
+            if passed >= rank:
+                break
+        return self._value(bucket)
+
+    def _histogram(self, id):
+        """Get buckets of durations of the job with numbers of runs."""
+        return self.connection.execute(
+            'SELECT bucket, runs FROM durations WHERE job = ? '
+            'ORDER BY bucket', (id,)).fetchall()
+
+    def close(self):
+        """Close the store."""
+        self.connection.close()
+        pass
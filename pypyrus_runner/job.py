@@ -1,7 +1,9 @@
 import os
 import re
 import sys
+import time
 import atexit
+import signal
 import argparse
 import configparser
 
@@ -10,7 +12,18 @@ import pypyrus_logbook as logbook
 from datetime import date, datetime
 
 from .scheduler import Scheduler
-from .parser import parse_schedule
+from .parser import read_meta
+from .schedule import JobSpec
+from .store import open_store
+from .history import History
+from .ledger import Ledger
+from .registry import wait
+
+try:
+    import resource
+except ImportError:
+    # Used resources are not known on Windows.
+    resource = None
 
 class Job():
     """Class describing job and its API"""
@@ -24,25 +37,59 @@ class Job():
         self.pwd = pwd
         self.root = root
 
+        # Scheduler or manager pass the base config and the schedule record
+        # of the job to the process. Parse them only if job was executed
+        # directly.
+        meta = read_meta(os.path.basename(sys.argv[0]))
+
         # Parse configuration objects.
-        self.baseconfig = Scheduler.parse_config(
-            main=f'{root}/config.ini', save=False)
+        if meta is not None:
+            self.baseconfig = configparser.ConfigParser(allow_no_value=True)
+            self.baseconfig.read_dict(meta['config'])
+        else:
+            self.baseconfig = Scheduler.parse_config(
+                main=f'{root}/config.ini', save=False)
         self.config = self.parse_config(paths=config, job=self)
         # Parse executor arguments.
         arguments = self._parse_arguments()
 
-        schedule = self._get_schedule()
-        self.id = schedule.id[0] if schedule is not None else None
+        spec = self._get_schedule(meta)
+        self.id = spec.id if spec is not None else None
 
-        self.trigger = arguments.trigger
+        # Trigger is given by the argument, then by the scheduler, then it
+        # is the current time.
+        trigger = arguments.trigger
+        if trigger is None and meta is not None:
+            trigger = meta['job'].get('trigger')
+            trigger = datetime.fromisoformat(trigger) if trigger else None
+        self.trigger = trigger or datetime.now()
         self.auto = arguments.auto
+        self.force = arguments.force
+
+        # Runs launched by the scheduler or the manager are saved to the
+        # history by them. Job saves only runs launched directly.
+        history = self.baseconfig['SCHEDULER'].get('history')
+        self.history = None
+        if meta is None and history and self.id is not None:
+            self.history = History(history)
+        self.__number = None
+        # Completed triggers are not executed again unless forced. Runs
+        # launched by the scheduler or the manager are saved to the ledger by
+        # them when the process exits with zero.
+        self.__launched = meta is not None
+        # Process that waits for the job run directly and saves its result.
+        self.__supervised = False
+        ledger = self.baseconfig['SCHEDULER'].get('ledger')
+        self.ledger = None
+        if ledger and self.id is not None:
+            self.ledger = Ledger(ledger)
 
         # Name of the application Launching by the job.
         name = name or self.config['JOB'].get('name')
-        self.name = name if schedule is None else schedule.name[0]
+        self.name = name if spec is None else spec.name
         # Description of the application Launching by the job.
         desc = desc or self.config['JOB'].get('desc')
-        self.desc = desc if schedule is None else schedule.description[0]
+        self.desc = desc if spec is None else spec.description
         # Emails for information and notifications.
         owner = self.baseconfig['INFO'].get('owner')
         persons = persons or self.config['JOB'].get('persons')
@@ -116,7 +163,26 @@ class Job():
     def push(self):
         """Basic method to start job script."""
         self.start_time = datetime.now()
+        if (
+            self.ledger is not None and self.force is False
+            and (self.id, self.trigger) in self.ledger
+        ):
+            self.log.info(
+                f'TRIGGER {self.trigger} ALREADY COMPLETED. '
+                'Use -f to run it again.')
+            sys.exit(0)
         self.open()
+        if self.history is not None:
+            self.__number = self.history.start(
+                self.id, self.trigger, time.time(), source='job',
+                pid=os.getpid())
+        if (
+            hasattr(os, 'fork') is True
+            and (
+                self.__number is not None
+                or self.ledger is not None and self.__launched is False)
+        ):
+            self._supervise()
         atexit.register(self.close)
         pass
 
@@ -138,29 +204,74 @@ class Job():
         spent = datetime.now() - self.start_time
         self.log.info('JOB FINISHED.')
         self.log.info('TIME SPENT: %s seconds.' % spent.seconds)
+        if self.__supervised is True:
+            # Result is saved by the waiting process.
+            return
+        if self.__number is not None:
+            # Exit code is not known without the waiting process.
+            cpu_time = max_rss = None
+            if resource is not None:
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                cpu_time = usage.ru_utime + usage.ru_stime
+                max_rss = usage.ru_maxrss
+            self.history.finish(
+                self.__number, time.time(), None, cpu_time, max_rss)
         pass
 
+    def _supervise(self):
+        """
+        Continue the job in the child process while this process waits for
+        it, saves its result by the real exit status and exits with it.
+        """
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            self.__supervised = True
+            return
+        # Interrupt from the terminal reaches the job itself. Termination is
+        # passed to the job.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(
+            signal.SIGTERM, lambda signum, frame: os.kill(pid, signum))
+        exit_code, rusage = wait(pid)
+        if self.__number is not None:
+            self.history.finish(
+                self.__number, time.time(), exit_code,
+                rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss)
+        if self.ledger is not None and exit_code == 0:
+            self.ledger.add([(self.id, self.trigger)])
+        # Process stopped by the signal is reported as the shell does.
+        os._exit(exit_code if exit_code >= 0 else 128 - exit_code)
+
     def _parse_arguments(self):
         """Initialize the trigger."""
         parser = argparse.ArgumentParser()
         parser.add_argument(
             '-t', '--trigger',
             help='Pass to job certain run time in format YYYYMMDD/YYYY-MM-DD/YYYYMMDDHH24MISS',
-            required=False, type=datetime.fromisoformat,
-            default=datetime.now())
+            required=False, type=datetime.fromisoformat)
         parser.add_argument(
             '-a', '--auto',
             help='Indicates that job was launched automatically by scheduler.',
             required=False, action='store_true')
+        parser.add_argument(
+            '-f', '--force',
+            help='Run the job even if the trigger was already completed.',
+            required=False, action='store_true')
         arguments = parser.parse_args()
         return arguments
 
-    def _get_schedule(self):
+    def _get_schedule(self, meta=None):
         """Extract record for current job from schedule."""
+        if meta is not None:
+            return JobSpec(**meta['job'])
         schedule_path = self.baseconfig['SCHEDULER'].get('schedule')
         if schedule_path is not None:
             filepath = os.path.abspath(os.path.basename(sys.argv[0]))
-            schedule = parse_schedule(schedule_path).select(file=filepath)
-            if schedule.COUNT_ROWS == 1:
-                return schedule
+            store = open_store(
+                schedule_path, self.baseconfig['SCHEDULER'].get('store'))
+            jobs = store.find_file(filepath)
+            if len(jobs) == 1:
+                return jobs[0]
         return None
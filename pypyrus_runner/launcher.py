@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import queue
+import shutil
+import signal
+import threading
+import subprocess
+
+# Signals ignored by Python that are restored to default in the job
+# process as subprocess.Popen does.
+SIGNALS = tuple(
+    getattr(signal, name) for name in ('SIGPIPE', 'SIGXFSZ')
+    if hasattr(signal, name) is True)
+
+class Process():
+    """
+    Class describing the job process requested from the launcher.
+    Request becomes a process handle when launcher spawns it.
+    """
+    def __init__(
+        self, executor, file, parameters=None, env=None, job=None,
+        limits=None
+    ):
+        self.executor = executor
+        self.file = file
+        self.parameters = parameters
+        # Additional environment variables of the process.
+        self.env = env or {}
+        # Limits of resources applied in the new process.
+        self.limits = limits
+        # Job record that requested the process.
+        self.job = job
+        self.pid = None
+        self.returncode = None
+        # Popen object if process was not spawned by os.posix_spawn.
+        self.popen = None
+        # Process is the child of the scheduler. Processes created by
+        # workers are children of workers.
+        self.child = True
+        # Error raised during the spawn.
+        self.error = None
+        # Time of request and seconds passed until the process was spawned.
+        self.requested = time.monotonic()
+        self.latency = None
+        pass
+
+    def __repr__(self):
+        return f'Process(file={self.file}, pid={self.pid})'
+
+    def poll(self):
+        """Get the exit code if process is finished."""
+        if self.popen is not None:
+            self.returncode = self.popen.poll()
+        return self.returncode
+
+class Launcher():
+    """
+    Class describing the launcher of job processes.
+    Launcher takes requests from the queue and spawns processes in the
+    separate thread so scheduler only puts requests there. Where possible
+    processes are created with os.posix_spawn which is cheaper than fork
+    of the growing scheduler process. Processes with limits of resources
+    are created with subprocess.Popen which applies them in the child.
+    Spawned and failed requests are returned through the queue of results.
+    """
+    def __init__(self, callback=None):
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        # Function called in the launcher thread right after the spawn.
+        self.callback = callback
+        # Resolved paths of executors.
+        self.executors = {}
+        self.__thread = threading.Thread(
+            target=self._run, name='launcher', daemon=True)
+        self.__thread.start()
+        pass
+
+    def launch(self, process):
+        """Request the process to be launched."""
+        self.requests.put(process)
+        return process
+
+    def collect(self):
+        """Get all processes handled since the last call."""
+        processes = []
+        while True:
+            try:
+                processes.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        return processes
+
+    def resolve(self, executor):
+        """Get the absolute path to the executor using the cache."""
+        path = self.executors.get(executor)
+        if path is None:
+            if re.match(r'^.*(\\|/).*$', executor):
+                path = os.path.abspath(executor)
+            else:
+                path = shutil.which(executor) or executor
+            self.executors[executor] = path
+        return path
+
+    def spawn(self, process):
+        """Create the process by request."""
+        executor = process.executor
+        if executor is not None:
+            executor = self.resolve(executor)
+        file = os.path.abspath(process.file) if process.file else None
+        command = [value for value in (executor, file) if value is not None]
+        if process.parameters is not None:
+            command.extend(process.parameters.split())
+
+        env = {**os.environ, **process.env}
+        limits = process.limits
+        if limits is not None and limits.spawned is True:
+            # Process spawned by os.posix_spawn can not limit itself.
+            process.popen = subprocess.Popen(
+                command, env=env, preexec_fn=limits.apply)
+            process.pid = process.popen.pid
+        elif hasattr(os, 'posix_spawn') is True:
+            process.pid = os.posix_spawn(
+                command[0], command, env, setsigdef=SIGNALS)
+        else:
+            process.popen = subprocess.Popen(command, env=env)
+            process.pid = process.popen.pid
+        process.latency = time.monotonic() - process.requested
+        return process
+
+    def _run(self):
+        """Handle requests in the loop."""
+        while True:
+            process = self.requests.get()
+            try:
+                self.spawn(process)
+                if self.callback is not None:
+                    self.callback(process)
+            except BaseException as error:
+                process.error = error
+            self.results.put(process)
+        pass
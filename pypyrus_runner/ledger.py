@@ -0,0 +1,47 @@
+import os
+import time
+import sqlite3
+
+from .parser import parse_trigger
+
+class Ledger():
+    """
+    Class describing the ledger of completed triggers.
+    Successful run of the job for the trigger is written once, so the job
+    is not executed again for the same trigger unless it is forced. Ledger
+    is the SQLite table where job and trigger are the primary key.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS ledger ('
+                'job TEXT NOT NULL, trigger TEXT NOT NULL, end_time REAL, '
+                'PRIMARY KEY (job, trigger)) WITHOUT ROWID')
+        pass
+
+    def __contains__(self, key):
+        """Check if the job was completed for the trigger."""
+        id, trigger = key
+        row = self.connection.execute(
+            'SELECT 1 FROM ledger WHERE job = ? AND trigger = ?',
+            (id, parse_trigger(trigger))).fetchone()
+        return row is not None
+
+    def add(self, completed):
+        """Save pairs of job id and trigger as completed."""
+        end_time = time.time()
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO ledger VALUES (?, ?, ?)',
+                ((id, parse_trigger(trigger), end_time)
+                 for id, trigger in completed))
+        pass
+
+    def close(self):
+        """Close the ledger."""
+        self.connection.close()
+        pass
@@ -0,0 +1,102 @@
+import os
+import signal
+
+try:
+    import resource
+except ImportError:
+    # Limits of resources are not available on Windows.
+    resource = None
+
+class Limits():
+    """
+    Class describing limits of the job process.
+    Timeout is seconds of wall time, max_rss is megabytes of resident
+    memory and cpu is seconds of processor time. CPU time is limited by
+    the kernel from the start of the process, timeout and memory are
+    watched by the scheduler which stops the process that crossed them.
+    None means no limit.
+    """
+    __slots__ = ('timeout', 'max_rss', 'cpu')
+    # Fields in the schedule and in the JOB section of the job config.
+    fields = {'timeout': float, 'max_rss': int, 'cpu': int}
+
+    def __init__(self, timeout=None, max_rss=None, cpu=None):
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.cpu = cpu
+        pass
+
+    def __repr__(self):
+        return (
+            f'Limits(timeout={self.timeout}, max_rss={self.max_rss}, '
+            f'cpu={self.cpu})')
+
+    def __bool__(self):
+        return any(getattr(self, name) is not None for name in self.fields)
+
+    @classmethod
+    def parse(cls, spec, config=None):
+        """
+        Get limits from the schedule record. Empty fields are taken from
+        the JOB section of the job config if it is given.
+        """
+        values = {}
+        for name, cast in cls.fields.items():
+            value = getattr(spec, name, None)
+            if value is None and config is not None:
+                value = config.get(name) or None
+            if value is not None:
+                try:
+                    value = cast(value)
+                except ValueError:
+                    raise ValueError(
+                        f'incorrect {name} {value!r} of job {spec.id}.')
+                if value <= 0:
+                    raise ValueError(
+                        f'incorrect {name} {value!r} of job {spec.id}.')
+            values[name] = value
+        return cls(**values)
+
+    @property
+    def spawned(self):
+        """Check if limits must be applied in the new process."""
+        return self.cpu is not None and resource is not None
+
+    def apply(self):
+        """
+        Limit resources of the current process. Called in the child right
+        before the job is executed. Process gets SIGXCPU when it used its
+        CPU time and is killed a second later.
+        """
+        if self.spawned is True:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu, self.cpu + 1))
+        pass
+
+    def crossed(self, run):
+        """Get the name of the limit crossed by the live run or None."""
+        if self.timeout is not None and run.duration >= self.timeout:
+            return 'timeout'
+        if self.max_rss is not None:
+            rss = resident(run.pid)
+            if rss is not None and rss >= self.max_rss:
+                return 'max_rss'
+        return None
+
+    def exhausted(self, run):
+        """Check if the finished run was stopped by the kernel for CPU."""
+        if self.cpu is None or resource is None:
+            return False
+        if run.exit_code == -signal.SIGXCPU:
+            return True
+        return (
+            run.exit_code == -signal.SIGKILL and run.cpu_time is not None
+            and run.cpu_time >= self.cpu)
+
+def resident(pid):
+    """Get megabytes of resident memory of the process or None."""
+    try:
+        with open(f'/proc/{pid}/statm', 'rb') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1048576
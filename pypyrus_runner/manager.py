@@ -1,17 +1,29 @@
 import os
+import re
 import sys
+import time
+import socket
 import shutil
+import argparse
 import platform
 import configparser
 
 import pypyrus_tables as tables
 import pypyrus_logbook as logbook
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from .job import Job
 from .scheduler import Scheduler
-from .parser import parse_schedule, parse_process
+from .schedule import Schedule
+from .parser import parse_process, parse_meta
+from .store import open_store
+from .registry import Run, wait
+from .history import History
+from .ledger import Ledger
+from .timetable import Timetable
+from .simulation import Simulation
+from .control import send
 
 class Manager():
     """
@@ -245,17 +257,16 @@ class Manager():
 
         # Add job to schedule.
         try:
-            with open(f'{root}/schedule.tsv', 'a+') as f:
-                strings = '\t'.join([
-                    '{job_id}', '{job_name}', '{job_desc}',
-                    '{job_environment}', '{job_path}',
-                    '{job_month_day}', '{job_week_day}',
-                    '{job_hour}', '{job_minute}', '{job_second}',
-                    # Empty cell for parameters.
-                    '',
-                    '{job_status}\n'
-                ]).format(**locals())
-                f.write(strings)
+            store = self._open_store(Scheduler.parse_config(save=False))
+            store.append({
+                'id': job_id, 'name': job_name, 'description': job_desc,
+                'environment': job_environment, 'file': job_path,
+                'month_day': job_month_day, 'week_day': job_week_day,
+                'hour': job_hour, 'minute': job_minute,
+                'second': job_second,
+                # Empty cell for parameters.
+                'parameters': '',
+                'status': job_status})
         except BaseException:
             self.log.error(f'Job {job_name} was not added to schedule.')
             self.log.error()
@@ -268,16 +279,21 @@ class Manager():
         """Execute the job by id and optionally by trigger."""
         self.log.subhead('run job')
         self.log.info(f'ID <{id}>')
+        # Completed trigger is executed again only if forced.
+        force = any(arg in ('-f', '--force') for arg in args)
+        args = [arg for arg in args if arg not in ('-f', '--force')]
         # Get scheduler config and schedule.
         config = Scheduler.parse_config(save=False)
-        schedule_path = config['SCHEDULER'].get('schedule')
-        job = parse_schedule(schedule_path).select(id=id)
-        if job.COUNT_ROWS > 1:
+        jobs = self._open_store(config).find(id)
+        if len(jobs) == 0:
+            self.log.critical('Job ID is not found!')
+        elif len(jobs) > 1:
             self.log.critical('Job ID is not unique!')
         else:
+            job = jobs[0]
             # Log job characteristics.
-            self.log.info(f'Name <{job.name[0]}>')
-            self.log.info(f'Description <{job.description[0]}>')
+            self.log.info(f'Name <{job.name}>')
+            self.log.info(f'Description <{job.description}>')
             # Trigger is optional.
             if len(args) == 0:
                 trigger = datetime.now().strftime('%Y-%m-%d/%H:%M:%S')
@@ -287,23 +303,58 @@ class Manager():
                 trigger = f'{args[0]}/{args[1]}'
             trigger_for_log = trigger.replace('/', ' ')
             self.log.info(f'Trigger <{trigger_for_log}>')
+            ledger = self._open_ledger(config)
+            if (
+                ledger is not None and force is False
+                and (job.id, trigger) in ledger
+            ):
+                self.log.warning(
+                    'Trigger is already completed. Use -f to run it again.')
+                return
             sure = None
             while sure not in ('Y', 'n'):
                 sure = input('\nAre you sure Y/n?\n')
                 if sure == 'Y':
-                    # Get all parameters for job process.
-                    environment = job.environment[0]
-                    file = job.file[0]
-                    parameters = f'-t {trigger}'
-                    executor = config['ENVIRONMENT'].get(environment)
-                    # Launch job process.
-                    self.log.info('Executing...')
-                    parse_process(executor, file, parameters).wait()
+                    # Running scheduler launches the job itself.
+                    answer = self._control(
+                        config, 'run', id=job.id, trigger=trigger,
+                        force=force)
+                    if answer is not None and answer['ok'] is True:
+                        self.log.info(
+                            'Submitted to the scheduler '
+                            f'<{answer["submitted"]}>')
+                    else:
+                        self._execute(config, job, trigger, force, ledger)
                     self.log.info('Done!')
                 else:
                     self.log.warning('Request canceled.')
         pass
 
+    def _execute(self, config, job, trigger, force=False, ledger=None):
+        """Run the job in the manager process and wait for it."""
+        # Get all parameters for job process.
+        environment = job.environment
+        file = job.file
+        parameters = f'-t {trigger}'
+        if force is True:
+            parameters += ' -f'
+        executor = config['ENVIRONMENT'].get(environment)
+        # Pass the schedule record and the config to the job.
+        env = parse_meta(job.record(), config)
+        # Launch job process.
+        self.log.info('Executing...')
+        process = parse_process(executor, file, parameters, env)
+        run = Run(job.id, trigger, process, environment)
+        if hasattr(os, 'wait4') is True:
+            run.finish(*wait(process.pid))
+        else:
+            run.finish(process.wait())
+        self._save_history(config, [run], 'manager')
+        if ledger is not None and run.exit_code == 0:
+            ledger.add([run.key])
+        self.log.info(f'Exit code <{run.exit_code}>')
+        pass
+
     def run_jobs(self, path):
         """Execute the list of jobs from the file."""
         # Get the table with jobs ids and triggers.
@@ -315,15 +366,204 @@ class Manager():
             self.run_job(id, trigger)
         pass
 
+    def backfill_job(self, id, *args):
+        """Execute the job for each trigger in the range."""
+        self.log.subhead('backfill job')
+        self.log.info(f'ID <{id}>')
+        parser = argparse.ArgumentParser(prog='backfill job')
+        parser.add_argument('start')
+        parser.add_argument('end')
+        parser.add_argument('step', nargs='?', default='1d')
+        parser.add_argument('-y', '--yes', action='store_true')
+        parser.add_argument('-p', '--parallel', type=int, default=1)
+        parser.add_argument('-r', '--retries', type=int, default=0)
+        parser.add_argument('-f', '--force', action='store_true')
+        arguments = parser.parse_args(args)
+        start = self._parse_trigger(arguments.start)
+        end = self._parse_trigger(arguments.end)
+        step = self._parse_step(arguments.step)
+        # Get scheduler config and schedule only once.
+        config = Scheduler.parse_config(save=False)
+        jobs = self._open_store(config).find(id)
+        if len(jobs) == 0:
+            self.log.critical('Job ID is not found!')
+            return
+        elif len(jobs) > 1:
+            self.log.critical('Job ID is not unique!')
+            return
+        job = jobs[0]
+        triggers = []
+        trigger = start
+        while trigger <= end:
+            triggers.append(trigger)
+            trigger += step
+        # Skip triggers that are already completed unless forced.
+        ledger = self._open_ledger(config)
+        if ledger is not None and arguments.force is False:
+            count = len(triggers)
+            triggers = [
+                trigger for trigger in triggers
+                if (job.id, trigger) not in ledger]
+            if len(triggers) < count:
+                self.log.info(
+                    f'Completed triggers <{count - len(triggers)}> skipped')
+        # Log job characteristics.
+        self.log.info(f'Name <{job.name}>')
+        self.log.info(f'Description <{job.description}>')
+        self.log.info(f'Triggers <{len(triggers)}> from <{start}> to <{end}>')
+        self.log.info(f'Parallel <{arguments.parallel}>')
+        if arguments.yes is False:
+            sure = None
+            while sure not in ('Y', 'n'):
+                sure = input('\nAre you sure Y/n?\n')
+            if sure == 'n':
+                self.log.warning('Request canceled.')
+                return
+
+        self.log.info('Executing...')
+        begin = time.time()
+        runs = []
+        failed = {}
+        try:
+            self._backfill(
+                config, job, triggers, max(arguments.parallel, 1),
+                arguments.retries, arguments.force, runs, failed)
+        finally:
+            # Finished runs are saved even if the backfill was interrupted,
+            # so it can be resumed without them.
+            self._save_history(config, runs, 'backfill')
+            if ledger is not None:
+                ledger.add(run.key for run in runs if run.exit_code == 0)
+        # Log the summary.
+        self.log.info(
+            f'Done in {time.time() - begin:0.3f} seconds! '
+            f'Succeeded <{len(triggers) - len(failed)}> '
+            f'Failed <{len(failed)}>')
+        for trigger, exit_code in failed.items():
+            self.log.warning(f'Trigger <{trigger}> failed with <{exit_code}>')
+        pass
+
+    def _backfill(
+        self, config, job, triggers, parallel, retries, force=False,
+        runs=None, failed=None
+    ):
+        """
+        Run the job for triggers keeping the given number of processes
+        running at once. Failed triggers are retried at the end of the
+        queue. Finished runs and exit codes or errors of failed triggers
+        are collected in the given list and dictionary. If the backfill is
+        interrupted running processes are stopped and waited.
+        """
+        executor = config['ENVIRONMENT'].get(job.environment)
+        # Pass the schedule record and the config to the job.
+        env = parse_meta(job.record(), config)
+        pending = [(trigger, 0) for trigger in reversed(triggers)]
+        running = {}
+        runs = runs if runs is not None else []
+        failed = failed if failed is not None else {}
+        try:
+            while len(pending) > 0 or len(running) > 0:
+                while len(pending) > 0 and len(running) < parallel:
+                    trigger, attempt = pending.pop()
+                    parameters = f'-t {trigger:%Y-%m-%d/%H:%M:%S}'
+                    if force is True:
+                        parameters += ' -f'
+                    try:
+                        process = parse_process(
+                            executor, job.file, parameters, env)
+                    except Exception as error:
+                        # Failed trigger does not stop the others.
+                        self.log.warning(
+                            f'Trigger <{trigger}> not executed: {error}')
+                        failed[trigger] = repr(error)
+                        if attempt < retries:
+                            pending.insert(0, (trigger, attempt + 1))
+                        continue
+                    run = Run(job.id, trigger, process, job.environment)
+                    running[process.pid] = (run, attempt)
+                if len(running) == 0:
+                    continue
+                pid, exit_code, rusage = self._wait_any(running)
+                if pid is None:
+                    continue
+                run, attempt = running.pop(pid)
+                run.finish(exit_code, rusage)
+                runs.append(run)
+                if exit_code == 0:
+                    failed.pop(run.trigger, None)
+                else:
+                    failed[run.trigger] = exit_code
+                    if attempt < retries:
+                        pending.insert(0, (run.trigger, attempt + 1))
+        except BaseException:
+            # No process is left behind.
+            for run, attempt in running.values():
+                run.terminate()
+            while len(running) > 0:
+                pid, exit_code, rusage = self._wait_any(running)
+                if pid is None:
+                    continue
+                run, attempt = running.pop(pid)
+                run.finish(exit_code, rusage)
+                runs.append(run)
+                failed[run.trigger] = exit_code
+            raise
+        return runs, failed
+
+    @staticmethod
+    def _wait_any(running):
+        """
+        Wait for one of running processes. Returns its process id, exit
+        code and used resources. Process id is None if the finished process
+        is not one of them.
+        """
+        if hasattr(os, 'wait4') is True:
+            pid, status, rusage = os.wait4(-1, 0)
+            if pid not in running:
+                return None, None, None
+            if os.WIFSIGNALED(status):
+                return pid, -os.WTERMSIG(status), rusage
+            return pid, os.WEXITSTATUS(status), rusage
+        # Systems without os.wait4 have to poll processes.
+        for pid, (run, attempt) in running.items():
+            exit_code = run.process.poll()
+            if exit_code is not None:
+                return pid, exit_code, None
+        time.sleep(0.1)
+        return None, None, None
+
+    @staticmethod
+    def _parse_trigger(string):
+        """Parse the trigger in yyyy-mm-dd or yyyy-mm-dd/hh24:mi:ss format."""
+        return datetime.fromisoformat(string.replace('/', ' '))
+
+    @staticmethod
+    def _parse_step(string):
+        """Parse the step as number of seconds, minutes, hours or days."""
+        match = re.match(r'^(\d+)([smhd]?)$', string)
+        if match is None:
+            raise ValueError(f'incorrect step {string}.')
+        value, unit = match.groups()
+        units = {'': 'seconds', 's': 'seconds', 'm': 'minutes',
+                 'h': 'hours', 'd': 'days'}
+        step = timedelta(**{units[unit]: int(value)})
+        if step.total_seconds() == 0:
+            raise ValueError(f'incorrect step {string}.')
+        return step
+
     def list_jobs(self, *args):
         """List all jobs in the schedule."""
-        # Get scheduler config and schedule.
+        # Get scheduler config and schedule. Running scheduler gives the
+        # schedule it works with.
         config = Scheduler.parse_config(save=False)
-        schedule_path = config['SCHEDULER'].get('schedule')
-        schedule = parse_schedule(schedule_path)
+        answer = self._control(config, 'jobs')
+        if answer is not None and answer['ok'] is True:
+            schedule = Schedule(answer['header'], answer['rows'])
+        else:
+            schedule = self._open_store(config).schedule()
         # Return whole table if no additional arguments passed.
         if len(args) == 0:
-            view = schedule
+            view = schedule.table()
         # In other case return that requested.
         else:
             if args[0] in ('active', 'inactive'):
@@ -335,7 +575,7 @@ class Manager():
                 # Warn that incorrect argument was used.
                 self.log.warning(f'Unknown parameter - {args[0]}. See *list jobs help*.')
                 return
-            view = schedule.select(**kwargs)
+            view = schedule.table(schedule.select(**kwargs))
         print(view)
         pass
 
@@ -346,13 +586,14 @@ class Manager():
         # Get scheduler config and schedule.
         config = Scheduler.parse_config(save=False)
         schedule_path = config['SCHEDULER'].get('schedule')
-        job = parse_schedule(schedule_path).select(id=id)
-        if job.COUNT_ROWS > 1:
+        store = self._open_store(config)
+        jobs = store.find(id)
+        if len(jobs) > 1:
             self.log.critical('Job ID is not unique!')
-        else:
+        elif len(jobs) == 1:
             # Log job characteristics.
-            self.log.info(f'Name <{job.name[0]}>')
-            self.log.info(f'Description <{job.description[0]}>')
+            self.log.info(f'Name <{jobs[0].name}>')
+            self.log.info(f'Description <{jobs[0].description}>')
 
         sure = None
         while sure not in ('Y', 'n'):
@@ -372,12 +613,12 @@ class Manager():
 
                 # Delete record with job in schedule.
                 try:
-                    schedule = parse_schedule(schedule_path).filter(id=id)
-                    schedule.write(schedule_path)
+                    store.remove(id)
                 except:
                     self.log.critical()
                 else:
                     self.log.info(f'Record in {schedule_path} REMOVED.')
+                    self._control(config, 'reload')
 
                 self.log.info('Done!')
 
@@ -421,12 +662,241 @@ class Manager():
         # Get scheduler config.
         config = Scheduler.parse_config(save = False)
         schedule_path = config['SCHEDULER'].get('schedule')
+        if config['SCHEDULER'].get('store') == 'sqlite':
+            self.log.warning('Schedule in SQLite can not be edited as text.')
+            return
         self.log.info(f'Editing {schedule_path}...')
         # Launch edition process and wait until it is completed.
         parse_process(editor, schedule_path).wait()
         self.log.info('Done!')
         pass
 
+    def import_schedule(self, path):
+        """Replace jobs in the schedule store by jobs from the tsv file."""
+        self.log.subhead('import schedule')
+        config = Scheduler.parse_config(save=False)
+        schedule = open_store(path).schedule()
+        self.log.info(f'Jobs <{len(schedule)}>')
+        sure = None
+        while sure not in ('Y', 'n'):
+            sure = input('\nAre you sure Y/n?\n')
+            if sure == 'Y':
+                self._open_store(config).write(schedule)
+                self.log.info('Done!')
+            elif sure == 'n':
+                self.log.info('Request canceled.')
+        pass
+
+    def stats_job(self, id):
+        """Show statistics of job runs from the history."""
+        self.log.subhead('stats job')
+        self.log.info(f'ID <{id}>')
+        config = Scheduler.parse_config(save=False)
+        path = config['SCHEDULER'].get('history')
+        if not path or os.path.exists(path) is False:
+            self.log.warning('History is not found.')
+            return
+        history = History(path)
+        stats = history.stats(id)
+        history.close()
+        self.log.info(f'Runs <{stats["runs"]}>')
+        self.log.info(f'Failed <{stats["failed"]}>')
+        if stats['failure_rate'] is not None:
+            self.log.info(f'Failure rate <{stats["failure_rate"]:0.2%}>')
+        for limit, count in stats['limits'].items():
+            self.log.info(f'Stopped by {limit} <{count}>')
+        for percentile in History.percentiles:
+            duration = stats[f'p{percentile}']
+            if duration is not None:
+                self.log.info(
+                    f'Duration p{percentile} <{duration:0.3f} seconds>')
+        pass
+
+    def simulate_schedule(self, *args):
+        """
+        Replay the schedule over the time range without launching jobs and
+        show the load it gives.
+        """
+        self.log.subhead('simulate schedule')
+        parser = argparse.ArgumentParser(prog='simulate schedule')
+        parser.add_argument('start', nargs='?')
+        parser.add_argument('end', nargs='?')
+        parser.add_argument('-d', '--duration', type=float, default=1.0)
+        parser.add_argument('-w', '--window', default='1m')
+        parser.add_argument('-b', '--bucket', default='1h')
+        parser.add_argument('-n', '--top', type=int, default=5)
+        parser.add_argument('-o', '--output')
+        arguments = parser.parse_args(args)
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        start = today
+        if arguments.start is not None:
+            start = self._parse_trigger(arguments.start)
+        end = start + timedelta(days=1)
+        if arguments.end is not None:
+            end = self._parse_trigger(arguments.end)
+        window = self._parse_step(arguments.window)
+        bucket = self._parse_step(arguments.bucket)
+        # Windows are counted in whole minutes.
+        window = max(int(window.total_seconds()) // 60, 1)
+        bucket = max(int(bucket.total_seconds()) // 60, 1)
+        config = Scheduler.parse_config(save=False)
+        timetable = Timetable(
+            *self._open_store(config).read(),
+            resolution=config['SCHEDULER'].getint('resolution'))
+        # Known durations of jobs are taken from the history.
+        durations = {}
+        path = config['SCHEDULER'].get('history')
+        if path and os.path.exists(path) is True:
+            history = History(path)
+            for id in timetable.ids:
+                durations[id] = history.duration(id)
+            history.close()
+        self.log.info(f'Jobs <{len(timetable)}>')
+        self.log.info(f'Range from <{start}> to <{end}>')
+        self.log.info(
+            f'Durations from history <'
+            f'{sum(value is not None for value in durations.values())}>')
+        self.log.info(f'Assumed duration <{arguments.duration} seconds>')
+
+        begin = time.time()
+        simulation = Simulation(
+            timetable, durations, arguments.duration,
+            config['SCHEDULER'].getint('jitter'))
+        simulation.run(start.timestamp(), end.timestamp())
+        spent = time.time() - begin
+        launches = sum(simulation.launches)
+        minutes = len(simulation.launches)
+        series = list(simulation.series(bucket))
+        if arguments.output is not None:
+            with open(arguments.output, 'w') as file:
+                file.write('TIME\tLAUNCHES\tPER_SECOND\tMAX_PER_SECOND\t'
+                           'MAX_RUNNING\n')
+                for moment, count, rate, peak in series:
+                    file.write(
+                        f'{moment:%Y-%m-%d %H:%M:%S}\t{count}\t'
+                        f'{count / (bucket * 60):0.3f}\t{rate}\t{peak}\n')
+            self.log.info(f'Series saved to {arguments.output}')
+        else:
+            for moment, count, rate, peak in series:
+                self.log.info(
+                    f'Time <{moment:%Y-%m-%d %H:%M}> Launches <{count}> '
+                    f'Max per second <{rate}> Max running <{peak}>')
+        self.log.info(f'Launches <{launches}>')
+        if minutes > 0:
+            self.log.info(
+                f'Launches per second <{launches / (minutes * 60):0.3f}>')
+            self.log.info(f'Max per second <{max(simulation.rates)}>')
+            self.log.info(f'Max running <{max(simulation.peaks)}>')
+        for moment, count in simulation.busiest(window, arguments.top):
+            self.log.info(
+                f'Busy window <{moment:%Y-%m-%d %H:%M}> Launches <{count}>')
+        self.log.info(
+            f'Done in {spent:0.3f} seconds! '
+            f'Minutes per second <{minutes / max(spent, 1e-9):0.0f}>')
+        pass
+
+    def _save_history(self, config, runs, source):
+        """Save finished runs to the history."""
+        path = config['SCHEDULER'].get('history')
+        if path:
+            history = History(path)
+            history.add(runs, source=source)
+            history.close()
+        pass
+
+    def status_scheduler(self):
+        """Show the state of the running scheduler."""
+        config = Scheduler.parse_config(save=False)
+        answer = self._control(config, 'status')
+        if answer is None:
+            self.log.warning('Scheduler is not running.')
+            return
+        for key, value in answer.items():
+            if key != 'ok':
+                self.log.info(f'{key.capitalize()} <{value}>')
+        pass
+
+    def list_running(self):
+        """Show live runs of the running scheduler."""
+        config = Scheduler.parse_config(save=False)
+        answer = self._control(config, 'running')
+        if answer is None:
+            self.log.warning('Scheduler is not running.')
+            return
+        now = time.time()
+        for run in answer['runs']:
+            self.log.info(
+                f'ID <{run["id"]}> Trigger <{run["trigger"]}> '
+                f'PID <{run["pid"]}> '
+                f'Running <{now - run["start_time"]:0.3f} seconds>')
+        self.log.info(f'Runs <{len(answer["runs"])}>')
+        pass
+
+    def pause_job(self, id):
+        """Deactivate the job."""
+        self._switch_job(id, 'pause', 'N')
+        pass
+
+    def resume_job(self, id):
+        """Activate the job."""
+        self._switch_job(id, 'resume', 'Y')
+        pass
+
+    def reload_schedule(self):
+        """Make the running scheduler apply the schedule at once."""
+        config = Scheduler.parse_config(save=False)
+        answer = self._control(config, 'reload')
+        if answer is None:
+            self.log.warning('Scheduler is not running.')
+        elif answer['ok'] is True:
+            self.log.info(f'Jobs changed <{answer["changed"]}>')
+        pass
+
+    def _switch_job(self, id, command, status):
+        """Change the status of the job by the scheduler or by itself."""
+        self.log.info(f'ID <{id}>')
+        config = Scheduler.parse_config(save=False)
+        answer = self._control(config, command, id=id)
+        if answer is None:
+            jobs = self._open_store(config).update(id, status=status)
+            if len(jobs) == 0:
+                self.log.critical('Job ID is not found!')
+                return
+        elif answer['ok'] is False:
+            return
+        self.log.info(f'Status <{status}>')
+        pass
+
+    def _control(self, config, command, **arguments):
+        """
+        Send the command to the running scheduler. Returns the answer or
+        None if there is no running scheduler.
+        """
+        path = config['SCHEDULER'].get('control')
+        if (
+            not path or hasattr(socket, 'AF_UNIX') is False
+            or os.path.exists(path) is False
+        ):
+            return None
+        try:
+            answer = send(path, command, **arguments)
+        except OSError:
+            return None
+        if answer['ok'] is False:
+            self.log.warning(f'Scheduler answered: {answer["error"]}')
+        return answer
+
+    def _open_ledger(self, config):
+        """Get the ledger of completed triggers if it is configured."""
+        path = config['SCHEDULER'].get('ledger')
+        return Ledger(path) if path else None
+
+    def _open_store(self, config):
+        """Get the schedule store of the scheduler."""
+        return open_store(
+            config['SCHEDULER'].get('schedule'),
+            config['SCHEDULER'].get('store'))
+
 help_notes = {
 'main': [
 '',
@@ -436,11 +906,21 @@ help_notes = {
 'create job          Generate a job with all elements.',
 'list jobs           Show all jobs registered in the schedule.',
 'edit schedule       Open the schedule file in the editor.',
+'import schedule     Copy jobs from the tsv file to the schedule store.',
 '',
 'edit job            Open the job script in the editor.',
 'run job             Execute the job by id with or without run time.',
 'run jobs            Execute the jobs listed in the file.',
+'backfill job        Execute the job for each trigger in the range.',
 'delete job          Delete the job by id.',
+'stats job           Show statistics of job runs.',
+'pause job           Deactivate the job by id.',
+'resume job          Activate the job by id.',
+'',
+'status scheduler    Show the state of the running scheduler.',
+'list running        Show jobs running by the scheduler.',
+'reload schedule     Make the running scheduler apply the schedule.',
+'simulate schedule   Replay the schedule over the range and show its load.',
 '',
 'edit config         Open one of the configuration files in the editor',
 '',
@@ -528,6 +1008,8 @@ help_notes = {
 'id         integer                  Id of the job you want to run.',
 'trigger    yyyy-mm-dd/hh24:mi:ss    Date with or without time in ISO format',
 '           yyyy-mm-dd               for what you want to run the job.',
+'-f, --force                         Run the job even if the trigger is',
+'                                    already completed in the ledger.',
 '',
 ],
 'run_jobs': [
@@ -538,12 +1020,85 @@ help_notes = {
 '        separated with a space.',
 '',
 ],
+'backfill_job': [
+'',
+'Execute the job for each trigger in the range.',
+'Parameters:',
+'id                integer                  Id of the job you want to run.',
+'from              yyyy-mm-dd/hh24:mi:ss    First trigger.',
+'to                yyyy-mm-dd/hh24:mi:ss    Last trigger.',
+'step              30s, 15m, 1h, 1d         Step between triggers. Default',
+'                                           is 1d.',
+'-y, --yes                                  Do not ask for confirmation.',
+'-p, --parallel    integer                  Number of triggers running at',
+'                                           once. Default is 1.',
+'-r, --retries     integer                  Number of retries of failed',
+'                                           triggers. Default is 0.',
+'-f, --force                                Run triggers already completed',
+'                                           in the ledger.',
+'',
+],
 'delete_job': [
 '',
 'Delete the job by id.',
 'Parameters:',
 'id    integer    Id of the job you want to delete.',
 ],
+'stats_job': [
+'',
+'Show number of runs, failure rate and duration percentiles of the job.',
+'Parameters:',
+'id    integer    Id of the job you want to see.',
+],
+'pause_job': [
+'',
+'Deactivate the job by id. Running scheduler applies it at once.',
+'Parameters:',
+'id    integer    Id of the job you want to pause.',
+],
+'resume_job': [
+'',
+'Activate the job by id. Running scheduler applies it at once.',
+'Parameters:',
+'id    integer    Id of the job you want to resume.',
+],
+'status_scheduler': [
+'',
+'Show the state of the running scheduler.',
+],
+'list_running': [
+'',
+'Show jobs running by the scheduler.',
+],
+'reload_schedule': [
+'',
+'Make the running scheduler apply the schedule at once.',
+],
+'simulate_schedule': [
+'',
+'Replay the schedule over the range on the virtual clock without running',
+'jobs. Show launches, jobs running at once and the busiest windows.',
+'Parameters:',
+'from              yyyy-mm-dd/hh24:mi:ss    Start of the range. Default is',
+'                                           today.',
+'to                yyyy-mm-dd/hh24:mi:ss    End of the range. Default is',
+'                                           one day after the start.',
+'-d, --duration    seconds                  Duration of jobs missing in the',
+'                                           history. Default is 1.',
+'-w, --window      15m, 1h, 1d              Size of busy windows. Default',
+'                                           is 1m.',
+'-b, --bucket      15m, 1h, 1d              Size of series rows. Default is',
+'                                           1h.',
+'-n, --top         integer                  Number of busy windows. Default',
+'                                           is 5.',
+'-o, --output      path                     Save series to the tsv file.',
+],
+'import_schedule': [
+'',
+'Replace jobs in the schedule store by jobs from the tsv file.',
+'Parameters:',
+'path    path to the tsv file with the schedule.',
+],
 'edit_config': [
 '',
 'Open one of the configuration files in the editor.',
@@ -0,0 +1,224 @@
+import os
+import bisect
+import threading
+import socketserver
+import http.server
+
+# Bounds of histogram buckets in seconds.
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Counter():
+    """Class describing the metric that only grows."""
+    type = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        pass
+
+    def inc(self, value=1):
+        """Increase the counter."""
+        self.value += value
+        pass
+
+    def lines(self):
+        yield f'{self.name} {self.value}'
+
+class Gauge():
+    """
+    Class describing the metric that is set to the current value.
+    Labeled gauge keeps the value for each label.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.value = 0
+        self.values = {}
+        pass
+
+    def set(self, value, label=None):
+        """Set the current value."""
+        if self.label is None:
+            self.value = value
+        else:
+            self.values[label] = value
+        pass
+
+    def lines(self):
+        if self.label is None:
+            yield f'{self.name} {self.value}'
+        else:
+            for label, value in list(self.values.items()):
+                yield f'{self.name}{{{self.label}="{label}"}} {value}'
+
+class Histogram():
+    """
+    Class describing the distribution of observed values.
+    Buckets are fixed so observation only increments one of counts.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # Count of observations in each bucket. The last one is +Inf.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        pass
+
+    def observe(self, value):
+        """Count the observed value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        pass
+
+    def quantile(self, q):
+        """
+        Get the upper bound of the bucket with the quantile of observed
+        values or None if there are no observations.
+        """
+        counts = list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def lines(self):
+        counts = list(self.counts)
+        total = 0
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            yield f'{self.name}_bucket{{le="{bound}"}} {total}'
+        total += counts[-1]
+        yield f'{self.name}_bucket{{le="+Inf"}} {total}'
+        yield f'{self.name}_sum {self.sum}'
+        yield f'{self.name}_count {total}'
+
+class Metrics():
+    """
+    Class describing the metrics of the scheduler.
+    Metrics are kept in memory and rendered in Prometheus text format.
+    """
+    def __init__(self, prefix='runner'):
+        self.prefix = prefix
+        self.items = []
+        self.lag = self.histogram(
+            'tick_lag_seconds', 'Delay of the scheduler moment.')
+        self.scan = self.histogram(
+            'scan_duration_seconds', 'Time of the schedule scan.')
+        self.reload = self.histogram(
+            'reload_duration_seconds', 'Time of the schedule reload.')
+        self.spawn = self.histogram(
+            'spawn_latency_seconds', 'Time from request to process spawn.')
+        self.start = self.histogram(
+            'start_lateness_seconds',
+            'Time from the due time of the job to its process spawn.')
+        self.launched = self.counter(
+            'jobs_launched_total', 'Number of launched jobs.')
+        self.skipped = self.counter(
+            'jobs_skipped_total',
+            'Number of runs skipped because the previous run was active.')
+        self.replaced = self.counter(
+            'runs_replaced_total',
+            'Number of active runs stopped to launch the next one.')
+        self.missed = self.counter(
+            'missed_runs_total', 'Number of missed runs launched later.')
+        self.deferred = self.counter(
+            'launches_deferred_total',
+            'Number of launches deferred because the host was busy.')
+        self.stopped = self.counter(
+            'runs_stopped_total',
+            'Number of runs stopped because they crossed their limits.')
+        self.failed = self.counter(
+            'spawns_failed_total', 'Number of failed spawns.')
+        self.queued = self.gauge(
+            'queue_depth', 'Number of jobs waiting for a free slot.')
+        self.running = self.gauge(
+            'running_jobs', 'Number of running jobs.', label='environment')
+        pass
+
+    def counter(self, name, help):
+        """Add the counter."""
+        return self._add(Counter(f'{self.prefix}_{name}', help))
+
+    def gauge(self, name, help, label=None):
+        """Add the gauge."""
+        return self._add(Gauge(f'{self.prefix}_{name}', help, label))
+
+    def histogram(self, name, help, buckets=BUCKETS):
+        """Add the histogram."""
+        return self._add(Histogram(f'{self.prefix}_{name}', help, buckets))
+
+    def render(self):
+        """Get all metrics in Prometheus text format."""
+        lines = []
+        for item in self.items:
+            lines.append(f'# HELP {item.name} {item.help}')
+            lines.append(f'# TYPE {item.name} {item.type}')
+            lines.extend(item.lines())
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, address):
+        """
+        Expose metrics over HTTP in the separate thread.
+        Address is a port, a host:port pair or a path to the Unix socket.
+        """
+        handler = type('Handler', (Handler,), {'metrics': self})
+        if address.isdigit() is True or ':' in address:
+            host, _, port = address.rpartition(':')
+            server = Server((host or '127.0.0.1', int(port)), handler)
+        else:
+            if os.path.exists(address) is True:
+                os.remove(address)
+            server = UnixServer(address, handler)
+        thread = threading.Thread(
+            target=server.serve_forever, name='metrics', daemon=True)
+        thread.start()
+        return server
+
+    def _add(self, item):
+        self.items.append(item)
+        return item
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Class describing the handler of metrics requests."""
+    metrics = None
+
+    def do_GET(self):
+        body = self.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        pass
+
+    def address_string(self):
+        # Unix socket has no client address.
+        return str(self.client_address or 'local')
+
+    def log_message(self, format, *args):
+        pass
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+# Unix sockets are not available on Windows.
+if hasattr(socketserver, 'UnixStreamServer') is True:
+    class UnixServer(
+        socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+    ):
+        daemon_threads = True
@@ -1,5 +1,6 @@
 import os
 import re
+import json
 import subprocess
 import configparser
 
@@ -7,6 +8,15 @@ import pypyrus_tables as tables
 
 from datetime import datetime
 
+# Number of values that time unit mask can hold. Covers all bases from 0 to
+# 59 which are used in the schedule.
+UNIT_SIZE = 64
+# Mask where all values are allowed.
+UNIT_FULL = (1 << UNIT_SIZE) - 1
+# Environment variable passing the job record and the base config from the
+# scheduler to the job process.
+JOB_VARIABLE = 'PYPYRUS_RUNNER_JOB'
+
 def parse_schedule(path):
     """Parse the schedule by path to the Table object."""
     schedule = tables.Table(path=path)
@@ -14,8 +24,32 @@ def parse_schedule(path):
     schedule.M_TIME = os.stat(path).st_mtime
     return schedule
 
-def parse_process(executor, path, parameters=None):
-    """Interface to open a process."""
+def parse_rows(path):
+    """
+    Read the schedule file to the list of fields and the dictionary of raw
+    rows by job keys. Key is a job id. Repeated ids get the number of
+    repetition as the suffix.
+    """
+    with open(path, 'r') as file:
+        lines = file.read().splitlines()
+    header = [
+        name.replace(' ', '_').lower() for name in lines[0].split('\t')]
+    position = header.index('id')
+    rows = {}
+    for line in lines[1:]:
+        # Skip empty lines.
+        if line == '':
+            continue
+        key = id = line.split('\t', position + 1)[position]
+        repetition = 0
+        while key in rows:
+            repetition += 1
+            key = f'{id}#{repetition}'
+        rows[key] = line
+    return header, rows
+
+def parse_command(executor, path, parameters=None):
+    """Get the list of process arguments."""
     if executor is not None:
         if re.match(r'^.*(\\|/).*$', executor):
             executor = os.path.abspath(executor)
@@ -29,4 +63,118 @@ def parse_process(executor, path, parameters=None):
         parameters = parameters.split()
         command.extend(parameters)
 
-    return subprocess.Popen(command)
+    return command
+
+def parse_process(executor, path, parameters=None, env=None):
+    """Interface to open a process."""
+    command = parse_command(executor, path, parameters)
+    if env is not None:
+        env = {**os.environ, **env}
+    return subprocess.Popen(command, env=env)
+
+def parse_meta(record, config):
+    """
+    Get environment variables passing the job record and the base config to
+    the job process.
+    """
+    meta = {
+        'job': record,
+        'config': {
+            section: dict(config.items(section, raw=True))
+            for section in config.sections()}
+    }
+    return {JOB_VARIABLE: json.dumps(meta)}
+
+def read_meta(path):
+    """
+    Get the job record and the base config passed to the process of the job
+    file. Returns None if nothing was passed.
+    """
+    meta = os.environ.get(JOB_VARIABLE)
+    if meta is None:
+        return None
+    meta = json.loads(meta)
+    # Variable could be inherited from the process of other job.
+    if os.path.abspath(meta['job']['file']) != os.path.abspath(path):
+        return None
+    return meta
+
+def parse_trigger(trigger):
+    """
+    Get the trigger as the string in the same format for all sources.
+    Trigger may be a datetime or a string in yyyy-mm-dd or
+    yyyy-mm-dd/hh24:mi:ss format.
+    """
+    if trigger is None:
+        return None
+    if isinstance(trigger, str) is True:
+        trigger = datetime.fromisoformat(trigger.replace('/', ' '))
+    return trigger.isoformat(sep=' ', timespec='seconds')
+
+def parse_depends(depends):
+    """Get ids of upstream jobs separated with commas or spaces."""
+    if not depends:
+        return ()
+    return tuple(id for id in re.split(r'[,\s]+', depends) if id)
+
+def parse_unit(unit):
+    """
+    Compile the time unit of the schedule to the bit mask where each set bit
+    is a value of base on which unit is true.
+    """
+    # Check if empty or *.
+    if re.match(r'^(\*)$', unit) is not None:
+        return UNIT_FULL
+    # Check if unit is lonely digit.
+    elif re.match(r'^\d+$', unit) is not None:
+        unit = int(unit)
+        return 1 << unit if unit < UNIT_SIZE else 0
+    # Check if unit is a cycle.
+    elif re.match(r'^/\d+$', unit) is not None:
+        unit = int(re.search(r'\d+', unit).group())
+        if unit == 0: return 0
+        return sum(1 << base for base in range(0, UNIT_SIZE, unit))
+    # Check if unit is a range.
+    elif re.match(r'^\d+-\d+$', unit):
+        unit = [int(i) for i in re.findall(r'\d+', unit)]
+        bases = range(unit[0], min(unit[1] + 1, UNIT_SIZE))
+        return sum(1 << base for base in bases)
+    # Check if unit is a list.
+    elif re.match(r'^\d+,\s*\d+.*$', unit):
+        unit = {int(i) for i in re.findall(r'\d+', unit)}
+        return sum(1 << base for base in unit if base < UNIT_SIZE)
+    # All other cases are never true.
+    else:
+        return 0
+
+def parse_millisecond(unit, resolution=1000):
+    """
+    Compile the millisecond unit of the schedule to the bit mask where each
+    set bit is a step of the second of the given number of milliseconds.
+    Values may end with ms. Empty unit is the start of the second.
+    Values that are not multiples of the resolution can not be scheduled,
+    so they are rejected instead of being moved to the step.
+    """
+    unit = re.sub(r'ms$', '', (unit or '0').strip()) or '0'
+    if re.match(r'^(\*)$', unit) is not None:
+        values = range(0, 1000, resolution)
+    elif re.match(r'^\d+$', unit) is not None:
+        values = [int(unit)]
+    elif re.match(r'^/\d+$', unit) is not None:
+        step = int(unit[1:])
+        if step == 0: return 0
+        values = range(0, 1000, step)
+    elif re.match(r'^\d+-\d+$', unit):
+        start, end = [int(i) for i in re.findall(r'\d+', unit)]
+        values = range(start, end + 1, resolution)
+    elif re.match(r'^\d+,\s*\d+.*$', unit):
+        values = [int(i) for i in re.findall(r'\d+', unit)]
+    else:
+        return 0
+    values = [value for value in values if value < 1000]
+    finer = [value for value in values if value % resolution != 0]
+    if len(finer) > 0:
+        raise ValueError(
+            f'millisecond {finer[0]} is finer than the resolution '
+            f'{resolution} ms')
+    return sum(1 << value // resolution for value in set(values))
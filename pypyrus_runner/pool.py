@@ -0,0 +1,210 @@
+import os
+import time
+import collections
+
+class Pool():
+    """
+    Class describing the pool of running jobs.
+    Pool limits how many jobs may run at once in total and in each
+    environment. Jobs that do not fit the limits wait in the queue and are
+    launched in order of arrival as soon as slots are released. Rate of
+    launches may be limited by the token bucket. Launches of not critical
+    jobs are deferred while the host is busy.
+    """
+    def __init__(
+        self, limit=0, limits=None, rate=0, burst=0, admission=None
+    ):
+        # Maximum number of running jobs. Zero means no limit.
+        self.limit = limit
+        # Maximum number of running jobs for each environment.
+        self.limits = limits or {}
+        # Running processes with their environments.
+        self.running = {}
+        # Number of running processes in each environment.
+        self.counts = collections.Counter()
+        # Jobs waiting for a free slot.
+        self.pending = collections.deque()
+        # Tokens for launches.
+        self.bucket = Bucket(rate, burst)
+        # Thresholds of the host load.
+        self.admission = admission or Admission()
+        pass
+
+    def __len__(self):
+        return len(self.running)
+
+    def fits(self, environment, critical=False):
+        """
+        Check if one more job of the environment can be launched. Critical
+        jobs are not checked against the load of the host.
+        """
+        if (
+            critical is False
+            and self.admission.admits(len(self.running)) is False
+        ):
+            return False
+        if self.bucket.ready() is False:
+            return False
+        if self.limit > 0 and len(self.running) >= self.limit:
+            return False
+        limit = self.limits.get(environment, 0)
+        if limit > 0 and self.counts[environment] >= limit:
+            return False
+        return True
+
+    def take(self, process, environment):
+        """Occupy the slot by launched process."""
+        self.bucket.take()
+        self.running[process] = environment
+        self.counts[environment] += 1
+        pass
+
+    def release(self, process):
+        """Free the slot of finished process."""
+        environment = self.running.pop(process, None)
+        if environment is not None:
+            self.counts[environment] -= 1
+        pass
+
+    def wait(self, job, environment, critical=False):
+        """Put the job to the queue."""
+        self.pending.append((job, environment, critical, time.monotonic()))
+        pass
+
+    def next(self):
+        """
+        Get the first job from the queue that fits the limits now.
+        Jobs of busy environments stay in the queue keeping their order.
+        Job deferred by the load of the host longer than the maximum wait
+        is checked as critical.
+        """
+        wait = self.admission.wait
+        now = time.monotonic()
+        for item in self.pending:
+            job, environment, critical, queued = item
+            if wait > 0 and now - queued >= wait:
+                critical = True
+            if self.fits(environment, critical) is True:
+                self.pending.remove(item)
+                return job
+        return None
+
+    def delay(self):
+        """
+        Get seconds after which queued jobs must be checked again without
+        release of the slot. Zero means that only release lets them in.
+        """
+        if len(self.pending) == 0:
+            return 0
+        return max(self.bucket.delay(), self.admission.delay())
+
+class Admission():
+    """
+    Class describing the admission of launches by the load of the host.
+    Launch is deferred while the load average, available memory or number
+    of running jobs crosses its threshold. Host is sampled not more often
+    than once per interval. Zero threshold means no check.
+    """
+    # Seconds between samples of the host.
+    interval = 1.0
+
+    def __init__(self, load=0, memory=0, running=0, wait=0):
+        # Maximum load average for one minute.
+        self.load = load
+        # Minimum available memory in megabytes.
+        self.memory = memory
+        # Maximum number of running jobs.
+        self.running = running
+        # Maximum seconds the launch is deferred. Zero means no limit.
+        self.wait = wait
+        # Why the last launch was deferred or None if it was admitted.
+        self.reason = None
+        self.__sampled = None
+        self.__busy = None
+        pass
+
+    def admits(self, running):
+        """Check if one more job can be launched now."""
+        if self.running > 0 and running >= self.running:
+            self.reason = f'{running} JOBS RUNNING'
+        else:
+            self.reason = self._sample()
+        return self.reason is None
+
+    def delay(self):
+        """Get seconds till the next sample if the launch was deferred."""
+        return self.interval if self.reason is not None else 0
+
+    def _sample(self):
+        """Get the reason why the host is busy or None if it is not."""
+        now = time.monotonic()
+        if (
+            self.__sampled is not None
+            and now - self.__sampled < self.interval
+        ):
+            return self.__busy
+        self.__sampled = now
+        self.__busy = None
+        if self.load > 0 and hasattr(os, 'getloadavg') is True:
+            load = os.getloadavg()[0]
+            if load >= self.load:
+                self.__busy = f'LOAD AVERAGE {load:0.2f}'
+                return self.__busy
+        if self.memory > 0:
+            memory = self._available()
+            if memory is not None and memory < self.memory:
+                self.__busy = f'{memory} MB OF MEMORY AVAILABLE'
+        return self.__busy
+
+    @staticmethod
+    def _available():
+        """Get megabytes of available memory or None if it is unknown."""
+        try:
+            with open('/proc/meminfo', 'rb') as file:
+                for line in file:
+                    if line.startswith(b'MemAvailable:'):
+                        return int(line.split()[1]) // 1024
+        except OSError:
+            pass
+        return None
+
+class Bucket():
+    """
+    Class describing the token bucket limiting the rate of launches.
+    Bucket gets rate tokens per second and keeps not more than burst of
+    them. Each launch takes one token. Zero rate means no limit.
+    """
+    def __init__(self, rate=0, burst=0):
+        self.rate = rate
+        self.burst = burst if burst > 0 else max(rate, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        pass
+
+    def ready(self):
+        """Check if there is a token for one more launch."""
+        return self.delay() == 0
+
+    def take(self):
+        """Take the token for the launch."""
+        if self.rate > 0:
+            self._fill()
+            self.tokens -= 1
+        pass
+
+    def delay(self):
+        """Get seconds till the next token."""
+        if self.rate <= 0:
+            return 0
+        self._fill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def _fill(self):
+        """Add tokens for the time passed since the last fill."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        pass
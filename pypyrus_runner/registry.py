@@ -0,0 +1,267 @@
+import os
+import time
+import queue
+import signal
+import threading
+
+def wait(pid):
+    """Wait for the process. Returns its exit code and used resources."""
+    _, status, rusage = os.wait4(pid, 0)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status), rusage
+    return os.WEXITSTATUS(status), rusage
+
+class Run():
+    """Class describing one launched process of the job."""
+    def __init__(
+        self, id, trigger, process, environment=None, limits=None, child=True
+    ):
+        self.id = id
+        self.trigger = trigger
+        self.process = process
+        self.environment = environment
+        self.pid = process.pid
+        self.start_time = time.time()
+        self.end_time = None
+        self.exit_code = None
+        # Consumed resources. Known only where os.wait4 is available.
+        # Maximum resident set size is in kilobytes on Linux and in bytes on
+        # Mac OS.
+        self.max_rss = None
+        self.cpu_time = None
+        # Limits of the process, name of the limit that stopped it and
+        # monotonic time when it was asked to stop.
+        self.limits = limits
+        self.limit = None
+        self.stopped = None
+        # Process is the child of the scheduler. Processes created by
+        # workers are not and are reported by workers.
+        self.child = child
+        pass
+
+    def __repr__(self):
+        return f'Run(id={self.id}, trigger={self.trigger}, pid={self.pid})'
+
+    @property
+    def key(self):
+        """Pair of job id and trigger identifying the run."""
+        return (self.id, self.trigger)
+
+    @property
+    def duration(self):
+        """Wall time of the run in seconds."""
+        end_time = self.end_time if self.end_time is not None else time.time()
+        return end_time - self.start_time
+
+    def terminate(self):
+        """Ask the process to stop."""
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        pass
+
+    def kill(self):
+        """Stop the process at once."""
+        try:
+            os.kill(self.pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except ProcessLookupError:
+            pass
+        pass
+
+    def stop(self, limit):
+        """Ask the process that crossed the limit to stop."""
+        self.limit = limit
+        self.stopped = time.monotonic()
+        self.terminate()
+        pass
+
+    def finish(self, exit_code, rusage=None):
+        """Save results of the finished process."""
+        self.end_time = time.time()
+        self.exit_code = exit_code
+        # Process handle must know that its process was already reaped.
+        if self.process.returncode is None:
+            self.process.returncode = exit_code
+        popen = getattr(self.process, 'popen', None)
+        if popen is not None and popen.returncode is None:
+            popen.returncode = exit_code
+        if rusage is not None:
+            self.max_rss = rusage.ru_maxrss
+            self.cpu_time = rusage.ru_utime + rusage.ru_stime
+        if (
+            self.limit is None and self.limits is not None
+            and self.limits.exhausted(self) is True
+        ):
+            self.limit = 'cpu'
+        pass
+
+class Registry():
+    """
+    Class describing the registry of live runs.
+    Finished processes are reaped by the separate thread so scheduler never
+    blocks on its children. Reaper sleeps until some child is finished and
+    reaps it only if it is the process of the registered run, other
+    children of the scheduler are left to their owners. Process that ended
+    before it was registered is reaped right after the registration.
+    Reaped runs wait in the queue until scheduler collects them. Without
+    reaping the owner must report finished processes itself. Descriptor of
+    the registry becomes readable when some run is finished, so the
+    scheduler can sleep waiting for it.
+    """
+    # Seconds between checks of live processes.
+    interval = 0.01
+
+    def __init__(self, reap=True):
+        # Live runs by job id and trigger, by process id and by job id.
+        self.runs = {}
+        self.pids = {}
+        self.ids = {}
+        # Runs that were reaped but not collected yet.
+        self.finished = queue.Queue()
+        # Event is set each time some run is finished.
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.__read, self.__write = os.pipe()
+        os.set_blocking(self.__read, False)
+        os.set_blocking(self.__write, False)
+        self.__alive = threading.Event()
+        # Event is set each time some run is registered.
+        self.__changed = threading.Event()
+        self.__thread = None
+        if reap is True:
+            self.__thread = threading.Thread(
+                target=self._reap, name='reaper', daemon=True)
+            self.__thread.start()
+        pass
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __contains__(self, key):
+        return key in self.runs
+
+    @property
+    def fd(self):
+        """Descriptor that becomes readable when some run is finished."""
+        return self.__read
+
+    def add(self, run):
+        """Register the launched run."""
+        with self.lock:
+            self.runs[run.key] = run
+            self.pids[run.pid] = run
+            self.ids.setdefault(run.id, []).append(run)
+            self.__alive.set()
+        self.__changed.set()
+        pass
+
+    def get(self, id, trigger=None):
+        """Get live runs of the job optionally by trigger."""
+        with self.lock:
+            return [
+                run for run in self.ids.get(id, ())
+                if trigger is None or run.trigger == trigger]
+
+    def collect(self):
+        """Get all runs finished since the last call."""
+        self.event.clear()
+        try:
+            while os.read(self.__read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        runs = []
+        while True:
+            try:
+                runs.append(self.finished.get_nowait())
+            except queue.Empty:
+                break
+        return runs
+
+    def finish(self, pid, exit_code, rusage=None):
+        """Move run of the reaped process to finished."""
+        with self.lock:
+            run = self.pids.pop(pid, None)
+            if run is None:
+                return
+            if self.runs.get(run.key) is run:
+                self.runs.pop(run.key)
+            runs = self.ids[run.id]
+            runs.remove(run)
+            if len(runs) == 0:
+                self.ids.pop(run.id)
+            if len(self.pids) == 0:
+                self.__alive.clear()
+        run.finish(exit_code, rusage)
+        self.finished.put(run)
+        self.event.set()
+        try:
+            os.write(self.__write, b'\0')
+        except BlockingIOError:
+            # Pipe is full so the scheduler is woken anyway.
+            pass
+        pass
+
+    def _reap(self):
+        """Reap finished processes of registered runs in the loop."""
+        waitable = hasattr(os, 'waitid') and hasattr(os, 'wait4')
+        while True:
+            self.__alive.wait()
+            if waitable is False:
+                self._poll()
+                time.sleep(self.interval)
+                continue
+            # Wait for any finished child without reaping it.
+            try:
+                info = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOWAIT)
+            except ChildProcessError:
+                info = None
+            except InterruptedError:
+                continue
+            run = None
+            if info is not None:
+                with self.lock:
+                    run = self.pids.get(info.si_pid)
+            if run is not None and run.child is True:
+                self._wait(run, 0)
+            else:
+                # Finished child is not registered yet or belongs to other
+                # owner, so the wait returns at once until it is reaped.
+                # Registered runs are checked without waiting until the next
+                # registration.
+                self.__changed.clear()
+                self._poll()
+                self.__changed.wait(self.interval)
+        pass
+
+    def _poll(self):
+        """Reap processes of registered runs that are already finished."""
+        with self.lock:
+            runs = [run for run in self.pids.values() if run.child is True]
+        for run in runs:
+            if hasattr(os, 'wait4') is True:
+                self._wait(run, os.WNOHANG)
+            else:
+                # Systems without os.wait4 have to poll processes.
+                exit_code = run.process.poll()
+                if exit_code is not None:
+                    self.finish(run.pid, exit_code, None)
+        pass
+
+    def _wait(self, run, options):
+        """Reap the process of the run if it is finished."""
+        try:
+            pid, status, rusage = os.wait4(run.pid, options)
+        except (ChildProcessError, InterruptedError):
+            return
+        if pid == 0:
+            return
+        if os.WIFSIGNALED(status):
+            exit_code = -os.WTERMSIG(status)
+        elif os.WIFEXITED(status):
+            exit_code = os.WEXITSTATUS(status)
+        else:
+            return
+        self.finish(pid, exit_code, rusage)
+        pass
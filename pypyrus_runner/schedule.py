@@ -0,0 +1,216 @@
+import os
+import sys
+
+import pypyrus_tables as tables
+
+from .parser import parse_rows
+
+class JobSpec():
+    """
+    Class describing one job of the schedule.
+    Record has fixed fields so it is small and fast to read. Fields that
+    are used as keys are interned. Unknown columns of the schedule are kept
+    in extra.
+    """
+    __slots__ = (
+        'key', 'id', 'name', 'description', 'environment', 'file',
+        'month_day', 'week_day', 'hour', 'minute', 'second', 'millisecond',
+        'parameters', 'status', 'overlap', 'catchup', 'depends_on', 'jitter',
+        'priority', 'timeout', 'max_rss', 'cpu', 'extra')
+    # Fields that come from the schedule.
+    fields = __slots__[1:-1]
+
+    def __init__(
+        self, id, name=None, description=None, environment=None, file=None,
+        month_day='*', week_day='*', hour='*', minute='*', second='*',
+        millisecond=None, parameters='', status='Y', overlap=None,
+        catchup=None, depends_on=None, jitter=None, priority=None,
+        timeout=None, max_rss=None, cpu=None, key=None, **extra
+    ):
+        self.key = key or id
+        self.id = sys.intern(id)
+        self.name = name
+        self.description = description
+        self.environment = sys.intern(environment or 'python')
+        self.file = sys.intern(file) if file is not None else None
+        self.month_day = month_day
+        self.week_day = week_day
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        # Steps of the second. Empty value is the start of the second.
+        self.millisecond = millisecond or None
+        self.parameters = parameters or ''
+        self.status = status
+        # What to do when the previous run is still active: allow, skip,
+        # queue or replace. Scheduler default is used if it is empty.
+        self.overlap = overlap or None
+        # Which runs missed during downtime must be launched: none, latest
+        # or all. Scheduler default is used if it is empty.
+        self.catchup = catchup or None
+        # Ids of jobs that must succeed for the same trigger before the job
+        # is launched. Time fields of such job are not used.
+        self.depends_on = depends_on or None
+        # Maximum number of seconds the launch is delayed by. Scheduler
+        # default is used if it is empty.
+        self.jitter = jitter or None
+        # Priority class of the job: normal or critical. Launches of
+        # critical jobs are not deferred when the host is busy.
+        self.priority = priority or None
+        # Seconds of wall time, megabytes of resident memory and seconds of
+        # CPU time the run may use. Job config is used if they are empty.
+        self.timeout = timeout or None
+        self.max_rss = max_rss or None
+        self.cpu = cpu or None
+        self.extra = extra
+        pass
+
+    def __repr__(self):
+        return f'JobSpec(id={self.id}, file={self.file})'
+
+    def __getitem__(self, field):
+        """Get the field by name as in the schedule record."""
+        if field in self.fields:
+            return getattr(self, field)
+        return self.extra[field]
+
+    @classmethod
+    def parse(cls, header, row, key=None):
+        """Parse the raw row of the schedule."""
+        cells = row.split('\t')
+        if len(cells) != len(header):
+            raise ValueError(f'incomplete schedule row: {row!r}.')
+        return cls(key=key, **dict(zip(header, cells)))
+
+    @property
+    def active(self):
+        """Check if job must be scheduled."""
+        return self.status == 'Y'
+
+    def record(self):
+        """Get all fields of the job as the dictionary."""
+        record = {field: getattr(self, field) for field in self.fields}
+        record.update(self.extra)
+        return record
+
+class Schedule():
+    """
+    Class describing the schedule as the collection of jobs indexed by job
+    key, job id and job file. Collection is built once when the schedule is
+    read, so each lookup is a single dictionary access.
+    """
+    def __init__(self, header=None, rows=None):
+        # Schedule fields.
+        self.header = header or list(JobSpec.fields)
+        # Raw rows and jobs by keys.
+        self.rows = {}
+        self.jobs = {}
+        # Jobs by ids and by absolute paths of files.
+        self.ids = {}
+        self.files = {}
+        for key, row in (rows or {}).items():
+            self.add(key, row)
+        pass
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def __iter__(self):
+        return iter(self.jobs.values())
+
+    def __contains__(self, id):
+        return id in self.ids
+
+    @classmethod
+    def read(cls, path):
+        """Read the schedule file."""
+        return cls(*parse_rows(path))
+
+    def add(self, key, row):
+        """Add the job by its raw row."""
+        job = JobSpec.parse(self.header, row, key)
+        self.rows[key] = row
+        self.jobs[key] = job
+        self._index(job)
+        return job
+
+    def remove(self, id):
+        """Remove all jobs with the id. Returns removed jobs."""
+        jobs = list(self.find(id))
+        for job in jobs:
+            self.rows.pop(job.key)
+            self.jobs.pop(job.key)
+            self._unindex(job)
+        return jobs
+
+    def update(self, id, **fields):
+        """Change fields of all jobs with the id. Returns changed jobs."""
+        jobs = []
+        for old in list(self.find(id)):
+            record = old.record()
+            record.update(fields)
+            row = '\t'.join(
+                str(record.get(field) or '') for field in self.header)
+            job = JobSpec.parse(self.header, row, old.key)
+            self._unindex(old)
+            self.rows[job.key] = row
+            self.jobs[job.key] = job
+            self._index(job)
+            jobs.append(job)
+        return jobs
+
+    def find(self, id):
+        """Get jobs by id."""
+        return self.ids.get(id, [])
+
+    def find_file(self, path):
+        """Get jobs by path to the job file."""
+        return self.files.get(os.path.abspath(path), [])
+
+    def select(self, **fields):
+        """Get jobs where fields have the given values."""
+        return [
+            job for job in self.jobs.values()
+            if all(job[field] == value for field, value in fields.items())]
+
+    def table(self, jobs=None):
+        """Get jobs as the Table object to show them."""
+        jobs = self.jobs.values() if jobs is None else jobs
+        header = [field.upper() for field in self.header]
+        rows = [self.rows[job.key].split('\t') for job in jobs]
+        return tables.Table(rows=[header, *rows])
+
+    def write(self, path):
+        """
+        Save the schedule to the file. File is replaced at once so readers
+        never see it partially written.
+        """
+        header = [field.upper() for field in self.header]
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write('\t'.join(header) + '\n')
+            for row in self.rows.values():
+                file.write(row + '\n')
+        os.replace(temporary, path)
+        pass
+
+    def _index(self, job):
+        """Add the job to indexes."""
+        self.ids.setdefault(job.id, []).append(job)
+        if job.file:
+            file = os.path.abspath(job.file)
+            self.files.setdefault(file, []).append(job)
+        pass
+
+    def _unindex(self, job):
+        """Remove the job from indexes."""
+        for index, value in (
+            (self.ids, job.id),
+            (self.files, job.file and os.path.abspath(job.file))
+        ):
+            jobs = index.get(value)
+            if jobs is not None:
+                jobs.remove(job)
+                if len(jobs) == 0:
+                    index.pop(value)
+        pass
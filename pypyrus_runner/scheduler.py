@@ -1,19 +1,41 @@
 import os
-import re
 import sys
 import time
+import heapq
+import select
+import socket
+import platform
+import sqlite3
 import datetime
+import collections
 import configparser
 
 import pypyrus_logbook as logbook
 
-from .parser import parse_schedule, parse_process
+from .parser import parse_unit, parse_meta, parse_trigger
+from .timetable import Timetable
+from .store import open_store
+from .pool import Pool, Admission
+from .registry import Run, Registry
+from .history import History
+from .checkpoint import Checkpoint
+from .ledger import Ledger
+from .launcher import Process, Launcher
+from .workers import Workers
+from .metrics import Metrics
+from .control import Control
+from .limits import Limits
 
 class Scheduler():
     """Class describing the scheduler and its API."""
+    # Reap finished job processes in the separate thread.
+    reaper = True
+    # Launch python jobs from warm workers when they are configured.
+    warm = True
+
     def __init__(
         self, name=None, desc=None, config=None, schedule=None,
-        showtime=None, showdelay=None, *args, **kwargs
+        showtime=None, showdelay=None, mode=None, *args, **kwargs
     ):
         # Move to scheduler directory.
         root = os.path.abspath(os.path.dirname(sys.argv[0]))
@@ -32,11 +54,121 @@ class Scheduler():
         # In active phase a scheduler makes all necessary for scheduling
         # actions. In passive phase a scheduler sleep till the next moment.
         self.__moment = None
+        # Milliseconds in one step of the tick mode.
+        self.resolution = self.config['SCHEDULER'].getint('resolution')
+        # Moment in milliseconds and monotonic time in nanoseconds of the
+        # first step after synchronization and number of steps passed
+        # since it.
+        self.__base_moment = None
+        self.__base_time = None
+        self.__count = 0
+        # Last saved second.
+        self.__saved = None
+        # Scheduling mode. In tick mode a scheduler scans the schedule each
+        # second. In event mode a scheduler sleeps till the nearest job run.
+        self.mode = mode or self.config['SCHEDULER'].get('mode')
+        # How often in seconds the schedule is checked for modifications in
+        # event mode.
+        self.refresh = self.config['SCHEDULER'].getfloat('refresh')
+        # Queue of the nearest job runs used in event mode. Each item is a
+        # run moment, a job slot and a version of the slot.
+        self.queue = None
+        self.__refreshed = None
+
+        # Pool of running jobs limited in total and for each environment.
+        limits = self.config['CONCURRENCY']
+        self.pool = Pool(
+            limit=self.config['SCHEDULER'].getint('concurrency'),
+            limits={
+                environment: limits.getint(environment)
+                for environment in limits
+                if limits.get(environment) is not None},
+            rate=self.config['SCHEDULER'].getfloat('spawn_rate'),
+            burst=self.config['SCHEDULER'].getint('spawn_burst'),
+            admission=Admission(
+                load=self.config['SCHEDULER'].getfloat('admit_load'),
+                memory=self.config['SCHEDULER'].getint('admit_memory'),
+                running=self.config['SCHEDULER'].getint('admit_running'),
+                wait=self.config['SCHEDULER'].getfloat('admit_wait')))
+        # Maximum delay of launches in seconds. Each job is delayed by the
+        # offset found from its id, so the offset is the same after the
+        # restart.
+        self.jitter = self.config['SCHEDULER'].getint('jitter')
+        # Delayed launches. Each item is a launch time, a job slot, a
+        # version of the slot and a run moment.
+        self.delayed = []
+        # What to do with the job when its previous run is still active.
+        self.overlap = self.config['SCHEDULER'].get('overlap')
+        # Jobs waiting for the end of the previous run by job ids.
+        self.overlaps = {}
+        # Last completed moment is saved to launch runs missed during the
+        # downtime.
+        checkpoint = self.config['SCHEDULER'].get('checkpoint')
+        self.checkpoint = Checkpoint(checkpoint) if checkpoint else None
+        # Which missed runs are launched, how many of them per second and
+        # how many seconds back they are searched.
+        self.catchup = self.config['SCHEDULER'].get('catchup')
+        self.catchup_rate = self.config['SCHEDULER'].getint('catchup_rate')
+        self.catchup_window = self.config['SCHEDULER'].getfloat(
+            'catchup_window')
+        # Downstream jobs waiting for their upstream runs by job ids and
+        # triggers. Each value is the set of upstream jobs that have not
+        # succeeded yet or None if one of them failed. Triggers are
+        # forgotten after the window.
+        self.waiting = {}
+        # Heap of trigger times, job ids and triggers of waiting jobs to
+        # forget them in order of time whatever order they came in.
+        self.expiry = []
+        self.depends_window = self.config['SCHEDULER'].getfloat(
+            'depends_window')
+        # Missed runs waiting for the launch. Each item is a run moment, a
+        # job slot and a version of the slot.
+        self.backlog = collections.deque()
+        # Registry of live runs. Finished processes are reaped by it.
+        self.registry = Registry(reap=self.reaper)
+        # Live runs with timeout or memory limit by process ids and seconds
+        # they have to stop before they are killed.
+        self.limited = {}
+        self.kill_grace = self.config['SCHEDULER'].getfloat('kill_grace')
+        # Limits from job configs by paths with modification times.
+        self.__limits = {}
+        # Store of finished runs.
+        history = self.config['SCHEDULER'].get('history')
+        self.history = History(history) if history else None
+        # Ledger of completed triggers. Jobs are not launched again for them.
+        ledger = self.config['SCHEDULER'].get('ledger')
+        self.ledger = Ledger(ledger) if ledger else None
+        # Launcher creating job processes in the separate thread.
+        self.launcher = Launcher(callback=self._register)
+        # Warm Python workers creating processes for python environment.
+        self.workers = None
+        workers = self.config['SCHEDULER'].getint('workers')
+        if self.warm is True and workers > 0 and hasattr(os, 'fork') is True:
+            executor = self.config['ENVIRONMENT'].get('python')
+            self.workers = Workers(
+                self.launcher.resolve(executor), size=workers,
+                callback=self._register, finish=self.registry.finish)
 
         # Path to schedule file.
         schedule_path = schedule or self.config['SCHEDULER'].get('schedule')
-        # Parsed jobs from schedule file.
-        self.schedule = parse_schedule(schedule_path)
+        self.schedule_path = os.path.abspath(schedule_path)
+        # Storage of the schedule.
+        self.store = open_store(
+            self.schedule_path, self.config['SCHEDULER'].get('store'))
+        # Jobs from schedule compiled to find them for the moment.
+        self.timetable = Timetable(
+            *self.store.read(), resolution=self.resolution)
+        # Watcher of schedule modifications.
+        self.watcher = self.store.watch(
+            interval=self.config['SCHEDULER'].getfloat('poll'),
+            delay=self.config['SCHEDULER'].getfloat('debounce'))
+
+        # Metrics of the scheduler exposed in Prometheus text format.
+        self.metrics = Metrics()
+        self.metrics_address = self.config['SCHEDULER'].get('metrics')
+        # Control socket answering requests of the manager. Opened on start.
+        self.control = None
+        self.control_path = self.config['SCHEDULER'].get('control')
 
         # Log or not each scheduler moment.
         self.showtime = showtime or self.config['LOG'].getboolean('showtime')
@@ -52,7 +184,7 @@ class Scheduler():
         pass
 
     @property
-    def moment():
+    def moment(self):
         """Current scheduler moment"""
         return self.__moment
 
@@ -75,7 +207,33 @@ class Scheduler():
             'SCHEDULER': {
                 'name': 'scheduler',
                 'desc': 'Scheduler',
-                'schedule': os.path.abspath('schedule.tsv')
+                'schedule': os.path.abspath('schedule.tsv'),
+                'store': 'tsv',
+                'history': os.path.abspath('history.db'),
+                'ledger': '',
+                'mode': 'tick',
+                'resolution': '1000',
+                'refresh': '60',
+                'poll': '1',
+                'debounce': '1',
+                'concurrency': '0',
+                'spawn_rate': '0',
+                'spawn_burst': '0',
+                'jitter': '0',
+                'admit_load': '0',
+                'admit_memory': '0',
+                'admit_running': '0',
+                'admit_wait': '300',
+                'overlap': 'allow',
+                'checkpoint': os.path.abspath('scheduler.checkpoint'),
+                'catchup': 'none',
+                'catchup_rate': '1',
+                'catchup_window': '86400',
+                'depends_window': '86400',
+                'kill_grace': '10',
+                'workers': '0',
+                'metrics': '',
+                'control': os.path.abspath('scheduler.sock')
             },
             'INFO': {
                 'owner': None
@@ -100,7 +258,8 @@ class Scheduler():
                 'python': os.path.basename(os.path.splitext(sys.executable)[0]),
                 'cpp': 'cpp',
                 'java': 'java'
-            }
+            },
+            'CONCURRENCY': {}
         }
         # Read the configuration in files.
         config.read(abspaths)
@@ -117,51 +276,651 @@ class Scheduler():
                 config.write(main_file)
         return config
 
-    def start(self):
+    def start(self, mode=None):
         """Launch the scheduler."""
+        mode = mode or self.mode
+        if mode not in ('tick', 'event'):
+            raise ValueError(f'unknown scheduler mode {mode}.')
+        self.mode = mode
         self.log.head()
         self.log.info('%s STARTED.' % self.desc)
+        self._serve_metrics()
+        self._serve_control()
         # First scheduler moment.
         self._sync_time()
+        # Find runs missed since the last start.
+        if self.checkpoint is not None:
+            last = self.checkpoint.read()
+            if last is not None:
+                self._catch_up(last + 1, int(self.moment))
 
         # Iterate scheduler process.
-        while True:
-            self._process()
+        if mode == 'tick':
+            self._sleep((self.__base_time - time.monotonic_ns()) / 1e9)
+            while True:
+                self._process()
+        elif mode == 'event':
+            self._plan()
+            while True:
+                self._process_events()
+        pass
+
+    def run_job(self, i, moment=None, force=False, due=None):
+        """
+        Launch the job by slot considering its previous run and the pool.
+        Job is launched for the current moment if other is not given.
+        Completed trigger is launched again only if forced. Due time on the
+        monotonic clock is given for scheduled launches to measure their
+        lateness. Returns True if the job was submitted.
+        """
+        spec = self.timetable.records[i]
+        moment = moment if moment is not None else self.moment
+        job = {
+            'id': spec.id,
+            'trigger': datetime.datetime.fromtimestamp(int(moment)),
+            'name': spec.name,
+            'description': spec.description,
+            'file': spec.file,
+            'parameters': spec.parameters,
+            'environment': spec.environment,
+            'priority': spec.priority,
+            'limits': self._limits(spec),
+            'due': due
+        }
+        if (
+            self.ledger is not None and force is False
+            and self._completed(job) is True
+        ):
+            # Completed trigger is the success for downstream jobs.
+            self._resolve(job['id'], job['trigger'], True)
+            return False
+        policy = spec.overlap or self.overlap
+        if policy != 'allow' and self._overlap(job, policy) is True:
+            return False
+        self._submit(job)
+        return True
+
+    def _due(self, i):
+        """Launch the job due at the current moment or delay it."""
+        offset = self._offset(self.timetable.records[i])
+        if offset == 0:
+            self.run_job(i, due=self._monotonic(self.moment))
+        else:
+            version = self.timetable.versions[i]
+            heapq.heappush(
+                self.delayed, (self.moment + offset, i, version, self.moment))
+        pass
+
+    def _offset(self, spec):
+        """Get the delay of the job launch within its jitter."""
+        return Timetable.offset(spec, self.jitter)
+
+    def _check_delayed(self, now):
+        """Launch delayed jobs which time has come."""
+        delayed = self.delayed
+        versions = self.timetable.versions
+        while len(delayed) > 0 and delayed[0][0] <= now:
+            launch, i, version, moment = heapq.heappop(delayed)
+            # Job was changed or removed while the launch was delayed.
+            if versions[i] != version:
+                continue
+            self.run_job(i, moment, due=self._monotonic(launch))
+        pass
+
+    @staticmethod
+    def _monotonic(moment):
+        """Get the time of the monotonic clock for the moment."""
+        return time.monotonic() - time.time() + moment
+
+    def _completed(self, job):
+        """Check if the job was already completed for the trigger."""
+        try:
+            completed = (job['id'], job['trigger']) in self.ledger
+        except sqlite3.Error as error:
+            self.log.warning(f'Ledger NOT CHECKED: {error}')
+            return False
+        if completed is True:
+            self.log.info(
+                f'JOB {job["id"]} SKIPPED: '
+                f'TRIGGER {job["trigger"]} ALREADY COMPLETED')
+        return completed
+
+    def _overlap(self, job, policy):
+        """
+        Apply the policy if the previous run of the job is still active.
+        Returns True if the job must not be launched now.
+        """
+        id = job['id']
+        runs = self.registry.get(id)
+        if len(runs) == 0:
+            return False
+        if policy == 'skip' or (policy == 'queue' and id in self.overlaps):
+            self.metrics.skipped.inc()
+            self.log.warning(f'JOB {id} SKIPPED: PREVIOUS RUN IS ACTIVE')
+            return True
+        elif policy == 'queue':
+            self.overlaps[id] = job
+            self.log.info(f'JOB {id} WAITS FOR PREVIOUS RUN')
+            return True
+        elif policy == 'replace':
+            for run in runs:
+                run.terminate()
+                self.metrics.replaced.inc()
+                self.log.warning(
+                    f'RUN OF JOB {id} FOR {run.trigger} REPLACED')
+        return False
+
+    def _submit(self, job):
+        """
+        Launch the job or queue it if the pool is full or the host is busy.
+        """
+        environment = job['environment']
+        critical = job.get('priority') == 'critical'
+        if self.pool.fits(environment, critical) is False:
+            self.pool.wait(job, environment, critical)
+            reason = self.pool.admission.reason
+            if critical is False and reason is not None:
+                self.metrics.deferred.inc()
+                self.log.info(f'JOB {job["id"]} DEFERRED: {reason}')
+            else:
+                self.log.info(f'JOB {job["id"]} QUEUED')
+        else:
+            self._launch(job)
         pass
 
-    def run_job(self, i):
-        """Launch the job by index."""
+    def _launch(self, job):
+        """
+        Request the process for the job and occupy the slot in the pool.
+        Failed request fails only this run of the job.
+        """
+        id = job['id']
+        environment = job['environment']
+        parameters = job['parameters']
+        parameters += ' -a'
+        self.log.info(f'CREATING SUBPROCESS FOR JOB {id}')
+        process = None
         try:
-            schedule = self.schedule
-            id = schedule.id[i]
-            file = schedule.file[i]
-            parameters = schedule.parameters[i]
-            environment = schedule.environment[i]
-            parameters += ' -a'
-            self.log.info(f'CREATING SUBPROCESS FOR JOB {id}')
             executor = self.config['ENVIRONMENT'].get(environment)
-            # Job will run as separate process.
-            parse_process(executor, file, parameters)
+            # Job will run as separate process created by the launcher.
+            # Process receives its schedule record and base config from the
+            # scheduler instead of parsing them again.
+            env = parse_meta(self._describe(job), self.config)
+            process = Process(
+                executor, job['file'], parameters, env, job=job,
+                limits=job['limits'])
+            self.pool.take(process, environment)
+            if self.workers is not None and environment == 'python':
+                self.workers.launch(process)
+            else:
+                self.launcher.launch(process)
         except BaseException:
+            if process is not None:
+                self.pool.release(process)
+            self.metrics.failed.inc()
             self.log.error()
+            self._resolve(id, job['trigger'], False)
         else:
+            self.metrics.launched.inc()
+        pass
+
+    @staticmethod
+    def _describe(job):
+        """Get the schedule record of the job passed to the job process."""
+        record = {
+            key: value for key, value in job.items()
+            if isinstance(value, str) is True}
+        record['trigger'] = parse_trigger(job['trigger'])
+        return record
+
+    def _register(self, process):
+        """Register the spawned process. Called in the launcher thread."""
+        job = process.job
+        run = Run(
+            job['id'], job['trigger'], process, job['environment'],
+            job['limits'], child=process.child)
+        self.registry.add(run)
+        pass
+
+    def _limits(self, spec):
+        """
+        Get limits of the job. Empty fields of the schedule are taken from
+        the JOB section of the job config which is read again only when it
+        is modified.
+        """
+        config = None
+        if spec.file is not None:
+            path = os.path.join(
+                os.path.dirname(os.path.abspath(spec.file)), 'config.ini')
+            try:
+                modified = os.stat(path).st_mtime_ns
+            except OSError:
+                modified = None
+            cached = self.__limits.get(path)
+            if cached is not None and cached[0] == modified:
+                config = cached[1]
+            elif modified is not None:
+                parser = configparser.ConfigParser(allow_no_value=True)
+                try:
+                    parser.read(path)
+                except configparser.Error as error:
+                    self.log.warning(f'Job config {path} NOT READ: {error}')
+                if parser.has_section('JOB') is True:
+                    config = dict(parser['JOB'])
+                self.__limits[path] = (modified, config)
+        try:
+            return Limits.parse(spec, config)
+        except ValueError as error:
+            self.log.warning(f'Job config limits NOT APPLIED: {error}')
+            return Limits.parse(spec)
+
+    def _watch(self, run):
+        """Watch the live run if it has timeout or memory limit."""
+        limits = run.limits
+        if limits is not None and (
+            limits.timeout is not None or limits.max_rss is not None
+        ):
+            self.limited[run.pid] = run
+        pass
+
+    def _check_limits(self):
+        """
+        Stop runs that crossed their timeout or memory limit. Run that did
+        not stop in the grace period after SIGTERM is killed.
+        """
+        now = time.monotonic()
+        for pid, run in list(self.limited.items()):
+            if run.stopped is None:
+                limit = run.limits.crossed(run)
+                if limit is not None:
+                    run.stop(limit)
+                    self.metrics.stopped.inc()
+                    self.log.warning(
+                        f'JOB {run.id} FOR {run.trigger} CROSSED '
+                        f'{limit.upper()}: STOPPING')
+            elif now - run.stopped >= self.kill_grace:
+                self.limited.pop(pid)
+                run.kill()
+                self.log.warning(f'JOB {run.id} FOR {run.trigger} KILLED')
+        pass
+
+    def _check_pool(self):
+        """Release slots of finished jobs and launch queued jobs."""
+        processes = self.launcher.collect()
+        if self.workers is not None:
+            processes.extend(self.workers.collect())
+        for process in processes:
+            id = process.job['id']
+            if process.error is not None:
+                self.pool.release(process)
+                self.metrics.failed.inc()
+                self.log.error(
+                    f'SUBPROCESS FOR JOB {id} NOT CREATED: {process.error!r}')
+                self._resolve(id, process.job['trigger'], False)
+            else:
+                self.metrics.spawn.observe(process.latency)
+                if process.job['due'] is not None:
+                    self.metrics.start.observe(
+                        process.requested + process.latency
+                        - process.job['due'])
+                self.log.info(
+                    f'SUBPROCESS FOR JOB {id} CREATED '
+                    f'IN {process.latency:0.5f} SECONDS')
+                # Run is not registered if it is already finished.
+                run = self.registry.pids.get(process.pid)
+                if run is not None:
+                    self._watch(run)
+        runs = self.registry.collect()
+        for run in runs:
+            self.pool.release(run.process)
+            self.limited.pop(run.pid, None)
+            message = (
+                f'JOB {run.id} FINISHED WITH CODE {run.exit_code} '
+                f'IN {run.duration:0.3f} SECONDS')
+            if run.max_rss is not None:
+                message += f', MAX RSS {run.max_rss}'
+            if run.limit is not None:
+                message += f', STOPPED BY {run.limit.upper()}'
+            self.log.info(message)
+        if len(runs) > 0 and self.history is not None:
+            self._save_history(runs)
+        if len(runs) > 0 and self.ledger is not None:
+            self._save_ledger(runs)
+        # Launch downstream jobs whose upstream runs are all succeeded.
+        for run in runs:
+            self._resolve(run.id, run.trigger, run.exit_code == 0)
+        # Launch jobs that waited for the end of their previous runs.
+        for run in runs:
+            if (
+                run.id in self.overlaps
+                and len(self.registry.get(run.id)) == 0
+            ):
+                self._submit(self.overlaps.pop(run.id))
+        while True:
+            job = self.pool.next()
+            if job is None:
+                break
+            self._launch(job)
+        self._measure_pool()
+        pass
+
+    def _resolve(self, id, trigger, succeeded):
+        """
+        Apply the result of the job run for the trigger to the downstream
+        jobs. Downstream job is launched for the same trigger when it was
+        the last upstream run it waited for.
+        """
+        graph = self.timetable.graph
+        if id not in graph.downstreams:
+            return
+        waiting = self.waiting
+        expiry = self.expiry
+        # Forget triggers that were not completed in time. Jobs that were
+        # already launched are left in the heap and skipped here.
+        limit = time.time() - self.depends_window
+        while len(expiry) > 0 and expiry[0][0] < limit:
+            _, downstream, old = heapq.heappop(expiry)
+            if waiting.pop((downstream, old), False) is not False:
+                self.log.warning(f'JOB {downstream} FOR {old} NOT LAUNCHED.')
+        for downstream in graph.downstreams[id]:
+            key = (downstream, trigger)
+            if key not in waiting:
+                waiting[key] = set(graph.upstreams[downstream])
+                heapq.heappush(
+                    expiry, (trigger.timestamp(), downstream, trigger))
+            upstreams = waiting[key]
+            if upstreams is None:
+                continue
+            if succeeded is False:
+                waiting[key] = None
+                self.log.warning(
+                    f'JOB {downstream} FOR {trigger} BLOCKED: '
+                    f'UPSTREAM JOB {id} FAILED.')
+                continue
+            upstreams.discard(id)
+            if len(upstreams) > 0:
+                continue
+            waiting.pop(key)
+            timetable = self.timetable
+            for i in timetable.ids.get(downstream, ()):
+                if timetable.active >> i & 1 == 1:
+                    self.run_job(i, trigger.timestamp())
+        pass
+
+    def _save_history(self, runs):
+        """Save finished runs to the history."""
+        try:
+            self.history.add(runs, source='scheduler')
+        except sqlite3.Error as error:
+            self.log.warning(f'History NOT SAVED: {error}')
+        pass
+
+    def _save_ledger(self, runs):
+        """Save triggers of successful runs to the ledger."""
+        completed = [run.key for run in runs if run.exit_code == 0]
+        if len(completed) == 0:
+            return
+        try:
+            self.ledger.add(completed)
+        except sqlite3.Error as error:
+            self.log.warning(f'Ledger NOT SAVED: {error}')
+        pass
+
+    def _measure_pool(self):
+        """Update metrics of queued and running jobs."""
+        self.metrics.queued.set(len(self.pool.pending))
+        for environment, count in self.pool.counts.items():
+            self.metrics.running.set(count, environment)
+        pass
+
+    def _serve_metrics(self):
+        """Expose metrics if the address is configured."""
+        address = self.metrics_address
+        if address:
+            self.log.info(f'SERVING METRICS ON {address}...')
+            self.metrics.serve(address)
             self.log.ok()
         pass
 
+    def _serve_control(self):
+        """Open the control socket if it is configured."""
+        path = self.control_path
+        if path and hasattr(socket, 'AF_UNIX') is True:
+            self.log.info(f'OPENING CONTROL SOCKET {path}...')
+            self.control = Control(path, event=self.registry.event)
+            self.log.ok()
+        pass
+
+    def _check_control(self):
+        """Answer requests received by the control socket."""
+        if self.control is None:
+            return
+        for request in self.control.collect():
+            command = None
+            try:
+                if isinstance(request.message, dict) is False:
+                    raise ValueError('request must be a JSON object.')
+                arguments = dict(request.message)
+                command = arguments.pop('command', None)
+                name = self.commands.get(command)
+                if name is None:
+                    raise ValueError(f'unknown command {command}.')
+                answer = {'ok': True, **getattr(self, name)(**arguments)}
+            except (OSError, ValueError, TypeError, sqlite3.Error) as error:
+                self.log.warning(f'Command {command} FAILED: {error}')
+                answer = {'ok': False, 'error': str(error)}
+            except Exception as error:
+                # One bad request must never stop the scheduling.
+                self.log.error()
+                answer = {'ok': False, 'error': repr(error)}
+            request.reply(answer)
+        pass
+
+    # Methods answering commands of the control socket.
+    commands = {
+        'run': '_control_run',
+        'reload': '_control_reload',
+        'status': '_control_status',
+        'running': '_control_running',
+        'jobs': '_control_jobs',
+        'pause': '_control_pause',
+        'resume': '_control_resume'
+    }
+
+    def _control_run(self, id, trigger=None, force=False):
+        """Launch the job now for the given or current trigger."""
+        slots = self.timetable.ids.get(id)
+        if slots is None:
+            raise ValueError(f'job {id} is not found.')
+        moment = time.time()
+        if trigger is not None:
+            trigger = datetime.datetime.fromisoformat(parse_trigger(trigger))
+            moment = trigger.timestamp()
+        self.log.info(f'JOB {id} REQUESTED')
+        submitted = [self.run_job(i, moment, force) for i in sorted(slots)]
+        return {'submitted': submitted.count(True)}
+
+    def _control_reload(self):
+        """Apply the schedule at once."""
+        touched = self.timetable.update(*self.store.read())
+        self.log.info(f'Schedule RELOADED. Jobs changed: {len(touched)}.')
+        if self.queue is not None:
+            self._plan(touched)
+        return {'changed': len(touched)}
+
+    def _control_status(self):
+        """Get the state of the scheduler."""
+        return {
+            'name': self.name,
+            'pid': os.getpid(),
+            'mode': self.mode,
+            'moment': parse_trigger(
+                datetime.datetime.fromtimestamp(int(self.moment))),
+            'jobs': len(self.timetable),
+            'active': bin(self.timetable.active).count('1'),
+            'running': len(self.registry),
+            'queued': len(self.pool.pending),
+            'deferred_by': self.pool.admission.reason,
+            'delayed': len(self.delayed),
+            'backlog': len(self.backlog),
+            'waiting': len(self.waiting),
+            'start_lateness_p50': self.metrics.start.quantile(0.5),
+            'start_lateness_p99': self.metrics.start.quantile(0.99)
+        }
+
+    def _control_running(self):
+        """Get live runs."""
+        with self.registry.lock:
+            runs = list(self.registry.pids.values())
+        return {
+            'runs': [
+                {
+                    'id': run.id,
+                    'trigger': parse_trigger(run.trigger),
+                    'pid': run.pid,
+                    'environment': run.environment,
+                    'start_time': run.start_time
+                } for run in runs]}
+
+    def _control_jobs(self):
+        """Get the schedule as it is applied now."""
+        timetable = self.timetable
+        return {
+            'header': timetable.header,
+            'rows': {
+                key: timetable.rows[slot]
+                for key, slot in timetable.slots.items()}}
+
+    def _control_pause(self, id):
+        """Deactivate the job in the schedule and apply it at once."""
+        return self._control_switch(id, 'N')
+
+    def _control_resume(self, id):
+        """Activate the job in the schedule and apply it at once."""
+        return self._control_switch(id, 'Y')
+
+    def _control_switch(self, id, status):
+        """Change the status of the job and reload the schedule."""
+        if len(self.store.update(id, status=status)) == 0:
+            raise ValueError(f'job {id} is not found.')
+        self.log.info(f'JOB {id} STATUS CHANGED TO {status}')
+        return self._control_reload()
+
     def _sync_time(self):
-        """Set current scheduler moment."""
+        """
+        Set current scheduler moment. Moment is the next start of the step,
+        next steps are counted from it on the monotonic clock.
+        """
         self.log.info('SYNCHRONIZING THE TIME...')
-        self.__moment = time.time()
+        now = time.time_ns()
+        monotonic = time.monotonic_ns()
+        moment = -(-now // 1000000 // self.resolution) * self.resolution
+        self.__base_moment = moment
+        self.__base_time = monotonic + moment * 1000000 - now
+        self.__count = 0
+        self.__moment = moment / 1000
         self.log.ok()
         pass
 
     def _check_schedule(self):
-        """Check if schedule was modified. If yes then reparse it."""
-        path = self.schedule.PATH
-        m_time = os.stat(path).st_mtime
-        if self.schedule.M_TIME != m_time:
-            self.schedule = parse_schedule(path)
-            self.log.info('Schedule UPDATED.')
+        """Check if schedule was modified. If yes then apply the changes."""
+        if self.watcher.check() is False:
+            return
+        start = time.perf_counter()
+        try:
+            touched = self.timetable.update(*self.store.read())
+        except (OSError, ValueError, sqlite3.Error) as error:
+            # Schedule may be written at the moment. Try again later.
+            self.log.warning(f'Schedule NOT UPDATED: {error}')
+            self.watcher.retry()
+        else:
+            self.metrics.reload.observe(time.perf_counter() - start)
+            self.log.info(f'Schedule UPDATED. Jobs changed: {len(touched)}.')
+            # Nearest runs must be found again for the changed jobs.
+            if self.queue is not None:
+                self._plan(touched)
+        pass
+
+    def _plan(self, slots=None):
+        """
+        Fill the queue with the nearest run of each active job or only of
+        the given jobs.
+        """
+        moment = time.time()
+        timetable = self.timetable
+        if slots is None:
+            slots = timetable.split(timetable.active)
+            self.queue = []
+        queue = self.queue
+        for i in slots:
+            if timetable.active >> i & 1 == 0:
+                continue
+            next_time = timetable.next_time(i, moment)
+            if next_time is not None:
+                queue.append((next_time, i, timetable.versions[i]))
+        heapq.heapify(queue)
+        self.__refreshed = moment
+        pass
+
+    def _catch_up(self, start, end):
+        """
+        Find runs missed from start till end in one pass over the compiled
+        schedule and put them to the backlog according to job policies.
+        """
+        start = max(start, end - self.catchup_window)
+        if start >= end:
+            return
+        timetable = self.timetable
+        latest = every = 0
+        for i in timetable.split(timetable.active):
+            policy = timetable.records[i].catchup or self.catchup
+            if policy == 'latest':
+                latest |= 1 << i
+            elif policy == 'all':
+                every |= 1 << i
+        # Nothing to catch up when no job has the policy.
+        if latest == 0 and every == 0:
+            return
+        runs = []
+        # Only the last missed run of each job. Search from the end until
+        # all jobs are found.
+        for moment, bits in timetable.moments(start, end, latest, True):
+            bits &= latest
+            runs.extend((moment, i) for i in timetable.split(bits))
+            latest &= ~bits
+            if latest == 0:
+                break
+        for moment, bits in timetable.moments(start, end, every):
+            runs.extend((moment, i) for i in timetable.split(bits))
+        runs.sort()
+        versions = timetable.versions
+        self.backlog.extend((moment, i, versions[i]) for moment, i in runs)
+        self.log.warning(
+            f'{int(end - start)} SECONDS MISSED. '
+            f'RUNS TO CATCH UP: {len(runs)}.')
+        pass
+
+    def _check_backlog(self):
+        """Launch missed runs not exceeding the rate."""
+        backlog = self.backlog
+        versions = self.timetable.versions
+        count = 0
+        while len(backlog) > 0:
+            if self.catchup_rate > 0 and count >= self.catchup_rate:
+                break
+            moment, i, version = backlog.popleft()
+            # Job was changed or removed after the run was missed.
+            if versions[i] != version:
+                continue
+            self.metrics.missed.inc()
+            self.run_job(i, moment)
+            count += 1
+        pass
+
+    def _save_moment(self, moment):
+        """Save the last completed moment once per second."""
+        if self.checkpoint is not None and int(moment) != self.__saved:
+            self.checkpoint.write(moment)
+            self.__saved = int(moment)
         pass
 
     def _check_time(self, unit, base):
@@ -170,74 +929,83 @@ class Scheduler():
         unit - time unit that must be checked.
         base - current time unit.
         """
-        # Check if empty or *.
-        if re.match(r'^(\*)$', unit) is not None:
-            return True
-        # Check if unit is lonely digit and equals to base.
-        elif re.match(r'^\d+$', unit) is not None:
-            unit = int(unit)
-            return True if base == unit else False
-        # Check if unit is a cycle and integer division with base is true.
-        elif re.match(r'^/\d+$', unit) is not None:
-            unit = int(re.search(r'\d+', unit).group())
-            if unit == 0: return False
-            return True if base % unit == 0 else False
-        # Check if unit is a range and base is in this range.
-        elif re.match(r'^\d+-\d+$', unit):
-            unit = [int(i) for i in re.findall(r'\d+', unit)]
-            return True if base in range(unit[0], unit[1] + 1) else False
-        # Check if unit is a list and base is in this list.
-        elif re.match(r'^\d+,\s*\d+.*$', unit):
-            unit = [int(i) for i in re.findall(r'\d+', unit)]
-            return True if base in unit else False
-        # All other cases is not for the base.
-        else:
-            return False
+        return parse_unit(unit) >> base & 1 == 1
 
     def _scan_schedule(self):
         """Get full job list from the schedule."""
-        # Convert moment to time structure.
-        timestamp = time.localtime(self.__moment)
-        # Local copy of jobs.
-        jobs = self.schedule
-        for i, status in enumerate(jobs.status):
-            # Must be active.
-            if status == 'Y':
-                # Month days in range 1-31
-                if self._check_time(
-                    jobs.month_day[i], timestamp.tm_mday) is True:
-                    # Week days in range 1-7.
-                    # By default has a range 1-6. Correct it by 1.
-                    if self._check_time(
-                        jobs.week_day[i], timestamp.tm_wday + 1) is True:
-                        # Hours in range 0-23.
-                        if self._check_time(
-                            jobs.hour[i], timestamp.tm_hour) is True:
-                            # Minutes in range 0-59.
-                            if self._check_time(
-                                jobs.minute[i], timestamp.tm_min) is True:
-                                # Seconds in range 0-59.
-                                if self._check_time(
-                                    jobs.second[i], timestamp.tm_sec) is True:
-                                    yield i
+        # Moment is a whole number of milliseconds. Convert it to time
+        # structure and the step of the second.
+        moment = round(self.moment * 1000)
+        timestamp = time.localtime(moment // 1000)
+        step = moment % 1000 // self.resolution
+        # Find all matching jobs in one pass over compiled schedule.
+        yield from self.timetable.scan(timestamp, step)
 
     def _move(self):
         """
-        Increment the moment considering possible deviations from the real
-        time.
+        Sleep till the next step. Steps are counted on the monotonic clock,
+        so corrections of the system time do not shift them. System time is
+        only compared with the moment to notice its jumps.
         """
-        delay = time.time() - self.__moment
-        wait = 1.0 - delay
-        try:
-            time.sleep(wait)
-        except ValueError:
+        self.__count += 1
+        due = self.__base_time + self.__count * self.resolution * 1000000
+        self._sleep((due - time.monotonic_ns()) / 1e9)
+        now = time.monotonic_ns()
+        delay = (now - due) / 1e9
+        self.metrics.lag.observe(delay)
+        if self.showdelay is True:
+            self.log.info(f'DELAY: {delay:0.5f}')
+        last = self.__moment
+        moment = self.__base_moment + self.__count * self.resolution
+        self.__moment = moment / 1000
+        # System time that does not follow the monotonic clock.
+        drift = time.time_ns() - moment * 1000000 - (now - due)
+        if delay >= 1 or abs(drift) >= 1e9:
             self.log.warning('TIME IS BROKEN!')
             self._sync_time()
-        else:
-            self.__moment += 1
-        finally:
-            if self.showdelay is True:
-                self.log.info(f'DELAY: {delay:0.5f}')
+            self._catch_up(int(last) + 1, int(self.__moment))
+            self._sleep((self.__base_time - time.monotonic_ns()) / 1e9)
+        elif abs(drift) >= 1e6:
+            # Small corrections of the system time move next steps.
+            self.__base_time -= drift
+        pass
+
+    def _sleep(self, wait):
+        """
+        Sleep launching jobs that wait for the spawn rate or the load of
+        the host and answering control requests meanwhile.
+        """
+        end = time.monotonic() + wait
+        delay = self.pool.delay()
+        while 0 < delay < end - time.monotonic():
+            self._pause(delay)
+            self._check_pool()
+            delay = self.pool.delay()
+        self._pause(end - time.monotonic())
+        pass
+
+    def _pause(self, wait):
+        """
+        Sleep answering control requests meanwhile. Finished jobs are
+        handled at once so their downstream and queued jobs are launched
+        without waiting for the next step.
+        """
+        if platform.system() == 'Windows':
+            # Select works only with sockets on Windows.
+            time.sleep(max(wait, 0))
+            return
+        descriptors = [self.registry.fd, getattr(self.control, 'fd', None)]
+        descriptors = [fd for fd in descriptors if fd is not None]
+        end = time.monotonic() + wait
+        while True:
+            wait = end - time.monotonic()
+            if wait <= 0:
+                break
+            ready, _, _ = select.select(descriptors, [], [], wait)
+            if self.registry.fd in ready:
+                self._check_pool()
+            if self.control is not None and self.control.fd in ready:
+                self._check_control()
         pass
 
     def _process(self):
@@ -249,14 +1017,113 @@ class Scheduler():
         # Log current moment if it is needed.
         if self.showtime == True:
             self.log.info('')
+        # Answer requests that came at the end of the last step.
+        self._check_control()
 
         # Check that schedule was not modified.
         self._check_schedule()
+        # Free slots of finished jobs and launch queued ones.
+        self._check_pool()
+        # Stop runs that crossed their limits.
+        if len(self.limited) > 0:
+            self._check_limits()
         # Find jobs that must be launched at current moment.
-        for i in self._scan_schedule():
-            self.run_job(i)
+        start = time.perf_counter()
+        slots = list(self._scan_schedule())
+        self.metrics.scan.observe(time.perf_counter() - start)
+        for i in slots:
+            self._due(i)
+        self._check_delayed(self.moment)
+        self._save_moment(self.moment)
+        # Launch missed runs once per second.
+        if len(self.backlog) > 0 and self.__count % self.timetable.steps == 0:
+            self._check_backlog()
 
         # Passive phase.
         # Increment moment. Sleep till the next step.
         self._move()
         pass
+
+    def _process_events(self):
+        """
+        Scheduler process in event mode.
+        Launch all due jobs and sleep till the nearest run or the next check
+        of the schedule.
+        """
+        now = time.time()
+        # Answer requests of the control socket.
+        self._check_control()
+        # Check that schedule was not modified. With inotify it is cheap so
+        # schedule is checked on each wake.
+        if (
+            now - self.__refreshed >= self.refresh
+            or self.watcher.fd is not None
+        ):
+            self.__refreshed = now
+            self._check_schedule()
+        # Free slots of finished jobs and launch queued ones.
+        self._check_pool()
+        # Stop runs that crossed their limits.
+        if len(self.limited) > 0:
+            self._check_limits()
+        # Launch all jobs which time has come.
+        queue = self.queue
+        versions = self.timetable.versions
+        while len(queue) > 0 and queue[0][0] <= now:
+            moment, i, version = heapq.heappop(queue)
+            # Job was changed or removed after the run was planned.
+            if versions[i] != version:
+                continue
+            self.__moment = moment
+            self.metrics.lag.observe(now - moment)
+            if self.showtime == True:
+                self.log.info('')
+            self._due(i)
+            # Only the launched job needs its next run. Runs missed because
+            # of delay are not repeated.
+            next_time = self.timetable.next_time(
+                i, max(moment + 0.001, now))
+            if next_time is not None:
+                heapq.heappush(queue, (next_time, i, version))
+        self._check_delayed(now)
+        self._save_moment(now)
+        # Launch missed runs.
+        if len(self.backlog) > 0:
+            self._check_backlog()
+        # Sleep till the nearest event.
+        wake = self.__refreshed + self.refresh
+        # Missed runs are launched each second.
+        if len(self.backlog) > 0:
+            wake = min(wake, now + 1)
+        # Noticed modification of the schedule is checked after the delay.
+        if self.watcher.pending is True:
+            wake = min(wake, now + self.watcher.delay)
+            self.__refreshed = wake - self.refresh
+        if len(queue) > 0:
+            wake = min(wake, queue[0][0])
+        if len(self.delayed) > 0:
+            wake = min(wake, self.delayed[0][0])
+        # Jobs waiting for the spawn rate are launched with the next token.
+        # Jobs deferred by the load are checked with the next sample.
+        delay = self.pool.delay()
+        if delay > 0:
+            wake = min(wake, now + delay)
+        # Runs with limits are checked each second.
+        if len(self.limited) > 0:
+            wake = min(wake, now + 1)
+        wait = wake - time.time()
+        # Finished job wakes the scheduler to release its slot, launch
+        # queued and downstream jobs. Modification of the schedule wakes the
+        # scheduler when inotify is used. Control request wakes the
+        # scheduler in any case.
+        if wait > 0:
+            descriptors = [
+                self.registry.fd, self.watcher.fd,
+                getattr(self.control, 'fd', None)]
+            descriptors = [fd for fd in descriptors if fd is not None]
+            if platform.system() == 'Windows':
+                # Select works only with sockets on Windows.
+                self.registry.event.wait(wait)
+            else:
+                select.select(descriptors, [], [], wait)
+        pass
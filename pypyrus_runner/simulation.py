@@ -0,0 +1,233 @@
+import math
+import datetime
+
+from .timetable import Timetable
+
+class Simulation():
+    """
+    Class describing the replay of the schedule on the virtual clock.
+    Moments are stepped through the same compiled timetable the scheduler
+    scans, without sleeping and without launching anything. Each job is
+    assumed to run for its duration, so the number of jobs running at once
+    is found too.
+    Schedule repeats itself, so each distinct set of jobs matching a minute
+    is expanded to steps only once. Then each minute of the range costs one
+    lookup of the minute and its previous minutes where runs still go on.
+    """
+    def __init__(self, timetable, durations=None, duration=1.0, jitter=0):
+        self.timetable = timetable
+        steps = timetable.steps
+        # Steps in one minute.
+        self.width = 60 * steps
+        # Delay and duration of each job in steps.
+        durations = durations or {}
+        self.delays = {}
+        self.durations = {}
+        for i in timetable.split(timetable.active):
+            spec = timetable.records[i]
+            seconds = durations.get(spec.id)
+            seconds = seconds if seconds is not None else duration
+            self.delays[i] = Timetable.offset(spec, jitter) * steps
+            self.durations[i] = max(
+                math.ceil(round(seconds * 1000 / timetable.resolution, 6)), 1)
+        # Jobs with dependencies start when all their upstream jobs end.
+        self.chain = self._chain()
+        # Jobs with the same delay and duration are counted at once.
+        self.groups = {}
+        for i, delay in self.delays.items():
+            key = (delay, self.durations[i])
+            self.groups[key] = self.groups.get(key, 0) | 1 << i
+        # Minutes after the start of the job during which its runs go on.
+        self.span = max(
+            (
+                math.ceil((delay + length) / self.width)
+                for delay, length in self.groups), default=0)
+        # Launches and changes of running jobs by steps for each distinct
+        # set of jobs. Set number 0 is empty.
+        self.profiles = [None]
+        self.__numbers = {0: 0}
+        self.__cache = {}
+        # Launches, maximum launches per second and peak of running jobs by
+        # minutes of the last run.
+        self.start = None
+        self.launches = []
+        self.rates = []
+        self.peaks = []
+        pass
+
+    def _chain(self):
+        """
+        Get jobs with dependencies in order of run with masks of their
+        upstream jobs. Also finds their delays.
+        """
+        timetable = self.timetable
+        upstreams = timetable.graph.upstreams
+        chain = []
+        done = set()
+
+        def visit(id):
+            if id in done:
+                return
+            done.add(id)
+            masks = []
+            for upstream in sorted(upstreams.get(id, ())):
+                visit(upstream)
+                slots = [
+                    i for i in timetable.ids.get(upstream, ())
+                    if i in self.delays]
+                masks.append(timetable._join(slots))
+            if id not in upstreams:
+                return
+            for i in timetable.ids.get(id, ()):
+                if i not in self.delays:
+                    continue
+                ends = [
+                    self.delays[j] + self.durations[j]
+                    for mask in masks for j in timetable.split(mask)]
+                self.delays[i] = max(ends, default=0)
+                chain.append((i, masks))
+            pass
+
+        for id in sorted(timetable.ids):
+            visit(id)
+        return chain
+
+    def _profile(self, jobs):
+        """
+        Get the number of the set of jobs matching the minute. Launches and
+        changes of running jobs are found by steps when the set is new.
+        """
+        number = self.__numbers.get(jobs)
+        if number is not None:
+            return number
+        _, _, _, _, second, millisecond = self.timetable.index
+        steps = self.timetable.steps
+        size = (self.span + 1) * self.width
+        launches = [0] * size
+        changes = [0] * size
+        for s in range(60):
+            second_jobs = jobs & second[s]
+            if second_jobs == 0:
+                continue
+            for step in range(steps):
+                bits = second_jobs & millisecond[step]
+                if bits == 0:
+                    continue
+                for i, masks in self.chain:
+                    if all(bits & mask for mask in masks):
+                        bits |= 1 << i
+                base = s * steps + step
+                for (delay, length), group in self.groups.items():
+                    count = (bits & group).bit_count()
+                    if count > 0:
+                        launches[base + delay] += count
+                        changes[base + delay] += count
+                        changes[base + delay + length] -= count
+        number = len(self.profiles)
+        self.profiles.append((launches, changes))
+        self.__numbers[jobs] = number
+        return number
+
+    def _combine(self, numbers):
+        """
+        Get launches, maximum launches per second, peak change of running
+        jobs and total change for the minute from the sets of jobs of this
+        and previous minutes.
+        """
+        width = self.width
+        steps = self.timetable.steps
+        launches = [0] * width
+        changes = [0] * width
+        for k, number in enumerate(numbers):
+            if number == 0:
+                continue
+            profile = self.profiles[number]
+            part = slice(k * width, (k + 1) * width)
+            launches = list(map(sum, zip(launches, profile[0][part])))
+            changes = list(map(sum, zip(changes, profile[1][part])))
+        rate = max(
+            sum(launches[s:s + steps]) for s in range(0, width, steps))
+        peak = total = 0
+        for change in changes:
+            total += change
+            peak = max(peak, total)
+        return (sum(launches), rate, peak, total)
+
+    def run(self, start, end):
+        """Step the virtual clock through minutes from start till end."""
+        timetable = self.timetable
+        month_day, week_day, hour, minute, _, _ = timetable.index
+        jobs = timetable.active
+        first = datetime.datetime.fromtimestamp(start // 60 * 60)
+        last = datetime.datetime.fromtimestamp(-(-end // 60) * 60 - 60)
+        self.start = first
+        self.launches = launches = []
+        self.rates = rates = []
+        self.peaks = peaks = []
+        # Numbers of sets of jobs of the last minutes, the latest first.
+        numbers = (0,) * (self.span + 1)
+        cache = self.__cache
+        running = 0
+        profile = self._profile
+        days = (last.date() - first.date()).days + 1
+        for n in range(days):
+            day = first.date() + datetime.timedelta(days=n)
+            # Week days in range 1-7 as in the scan.
+            day_jobs = jobs & month_day[day.day] & week_day[day.isoweekday()]
+            for h in range(24):
+                hour_jobs = day_jobs & hour[h]
+                for m in range(60):
+                    if n == 0 or n == days - 1:
+                        moment = datetime.datetime.combine(
+                            day, datetime.time(h, m))
+                        if moment < first or moment > last:
+                            continue
+                    number = 0
+                    if hour_jobs != 0:
+                        number = profile(hour_jobs & minute[m])
+                    numbers = (number, *numbers[:-1])
+                    stats = cache.get(numbers)
+                    if stats is None:
+                        stats = cache[numbers] = self._combine(numbers)
+                    launches.append(stats[0])
+                    rates.append(stats[1])
+                    peaks.append(running + stats[2])
+                    running += stats[3]
+        pass
+
+    def series(self, size):
+        """
+        Get launches, maximum launches per second and peak of running jobs
+        in windows of the given number of minutes.
+        """
+        size = max(size, 1)
+        for n in range(0, len(self.launches), size):
+            part = slice(n, n + size)
+            yield (
+                self._time(n), sum(self.launches[part]),
+                max(self.rates[part]), max(self.peaks[part]))
+
+    def busiest(self, size, top=5):
+        """
+        Get start times and launches of windows of the given number of
+        minutes with the most launches. Windows do not overlap.
+        """
+        size = max(size, 1)
+        launches = self.launches
+        total = sum(launches[:size])
+        windows = [(total, 0)]
+        for n in range(size, len(launches)):
+            total += launches[n] - launches[n - size]
+            windows.append((total, n - size + 1))
+        windows.sort(key=lambda window: (-window[0], window[1]))
+        found = []
+        for total, n in windows:
+            if len(found) == top or total == 0:
+                break
+            if all(abs(n - other) >= size for other, _ in found):
+                found.append((n, total))
+        return [(self._time(n), total) for n, total in found]
+
+    def _time(self, n):
+        """Get the time of the simulated minute by its number."""
+        return self.start + datetime.timedelta(minutes=n)
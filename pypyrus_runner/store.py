@@ -0,0 +1,271 @@
+import os
+import time
+import sqlite3
+
+from .parser import parse_rows
+from .schedule import JobSpec, Schedule
+from .watcher import Watcher
+
+def open_store(path, kind='tsv'):
+    """Get the schedule store of the kind by path."""
+    if kind in (None, '', 'tsv'):
+        return TsvStore(path)
+    elif kind == 'sqlite':
+        return SqliteStore(path)
+    raise ValueError(f'unknown schedule store {kind}.')
+
+class TsvStore():
+    """
+    Class describing the schedule stored in the tsv file.
+    File is always read as a whole. Modified schedule replaces the file at
+    once.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        pass
+
+    def read(self):
+        """Get the list of fields and the dictionary of raw rows."""
+        return parse_rows(self.path)
+
+    def schedule(self):
+        """Get all jobs."""
+        return Schedule(*self.read())
+
+    def watch(self, interval=1.0, delay=1.0):
+        """Get the watcher of schedule modifications."""
+        return Watcher(self.path, interval=interval, delay=delay)
+
+    def find(self, id):
+        """Get jobs by id."""
+        return self.schedule().find(id)
+
+    def find_file(self, path):
+        """Get jobs by path to the job file."""
+        return self.schedule().find_file(path)
+
+    def select(self, **fields):
+        """Get jobs where fields have the given values."""
+        return self.schedule().select(**fields)
+
+    def append(self, record):
+        """Add the job record."""
+        with open(self.path, 'r') as file:
+            header = file.readline().rstrip('\n').split('\t')
+        header = [name.replace(' ', '_').lower() for name in header]
+        row = [str(record.get(field) or '') for field in header]
+        with open(self.path, 'a') as file:
+            file.write('\t'.join(row) + '\n')
+        pass
+
+    def update(self, id, **fields):
+        """Change fields of the job. Returns changed jobs."""
+        schedule = self.schedule()
+        jobs = schedule.update(id, **fields)
+        if len(jobs) > 0:
+            self.write(schedule)
+        return jobs
+
+    def remove(self, id):
+        """Delete the job. Returns deleted jobs."""
+        schedule = self.schedule()
+        jobs = schedule.remove(id)
+        if len(jobs) > 0:
+            self.write(schedule)
+        return jobs
+
+    def write(self, schedule):
+        """Replace all jobs by the given schedule."""
+        schedule.write(self.path)
+        pass
+
+class SqliteStore():
+    """
+    Class describing the schedule stored in the SQLite database.
+    Jobs are rows of the schedule table indexed by id, file and status, so
+    lookups do not read the whole schedule. Each modification is a
+    transaction. Committed modifications change the data version that is
+    checked by the scheduler instead of the file time.
+    """
+    # Indexed fields.
+    indexes = ('id', 'file', 'status')
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with self._connect() as connection:
+            columns = ', '.join(
+                f'{field} TEXT NOT NULL' if field == 'id' else f'{field} TEXT'
+                for field in JobSpec.fields)
+            connection.execute(
+                f'CREATE TABLE IF NOT EXISTS schedule ({columns})')
+            for field in self.indexes:
+                connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS schedule_{field} '
+                    f'ON schedule ({field})')
+        pass
+
+    @property
+    def header(self):
+        """Fields of the schedule."""
+        with self._connect() as connection:
+            table = connection.execute('PRAGMA table_info(schedule)')
+            return [column[1] for column in table]
+
+    def read(self):
+        """Get the list of fields and the dictionary of raw rows."""
+        header = self.header
+        rows = {}
+        with self._connect() as connection:
+            result = connection.execute(
+                'SELECT * FROM schedule ORDER BY rowid')
+            position = header.index('id')
+            for values in result:
+                key = id = values[position]
+                repetition = 0
+                while key in rows:
+                    repetition += 1
+                    key = f'{id}#{repetition}'
+                rows[key] = '\t'.join(value or '' for value in values)
+        return header, rows
+
+    def schedule(self):
+        """Get all jobs."""
+        return Schedule(*self.read())
+
+    def watch(self, interval=1.0, delay=1.0):
+        """Get the watcher of schedule modifications."""
+        return VersionWatcher(self.path, interval=interval)
+
+    def find(self, id):
+        """Get jobs by id."""
+        return self.select(id=id)
+
+    def find_file(self, path):
+        """Get jobs by path to the job file."""
+        return self.select(file=os.path.abspath(path))
+
+    def select(self, **fields):
+        """Get jobs where fields have the given values."""
+        header = self.header
+        where, values = self._where(header, fields)
+        with self._connect() as connection:
+            result = connection.execute(
+                f'SELECT * FROM schedule{where} ORDER BY rowid', values)
+            return [
+                JobSpec(**dict(zip(header, self._strings(row))))
+                for row in result]
+
+    def append(self, record):
+        """Add the job record."""
+        header = self.header
+        values = [str(record.get(field) or '') for field in header]
+        marks = ', '.join('?' for field in header)
+        with self._connect() as connection:
+            connection.execute(
+                f'INSERT INTO schedule VALUES ({marks})', values)
+        pass
+
+    def update(self, id, **fields):
+        """Change fields of the job. Returns changed jobs."""
+        header = self.header
+        self._check(header, fields)
+        if len(fields) == 0:
+            return self.find(id)
+        columns = ', '.join(f'{field} = ?' for field in fields)
+        values = [str(value) for value in fields.values()]
+        with self._connect() as connection:
+            connection.execute(
+                f'UPDATE schedule SET {columns} WHERE id = ?', [*values, id])
+        return self.find(id)
+
+    def remove(self, id):
+        """Delete the job. Returns deleted jobs."""
+        jobs = self.find(id)
+        with self._connect() as connection:
+            connection.execute('DELETE FROM schedule WHERE id = ?', [id])
+        return jobs
+
+    def write(self, schedule):
+        """Replace all jobs by the given schedule."""
+        header = self.header
+        with self._connect() as connection:
+            connection.execute('DELETE FROM schedule')
+            marks = ', '.join('?' for field in header)
+            connection.executemany(
+                f'INSERT INTO schedule VALUES ({marks})',
+                ([str(job.record().get(field) or '') for field in header]
+                 for job in schedule))
+        pass
+
+    def _connect(self):
+        """Open the connection. Used as the context of one transaction."""
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _where(self, header, fields):
+        """Get the condition and its values for the fields."""
+        self._check(header, fields)
+        if len(fields) == 0:
+            return '', []
+        where = ' AND '.join(f'{field} = ?' for field in fields)
+        return f' WHERE {where}', list(fields.values())
+
+    @staticmethod
+    def _check(header, fields):
+        """Check that the fields are in the schedule."""
+        for field in fields:
+            if field not in header:
+                raise ValueError(f'unknown schedule field {field}.')
+        pass
+
+    @staticmethod
+    def _strings(row):
+        return [value or '' for value in row]
+
+class VersionWatcher():
+    """
+    Class describing the watcher of the SQLite schedule modifications.
+    Data version of the database is checked not more often than once per
+    interval. It changes each time other connection commits, and
+    modifications are committed as a whole, so there is nothing to wait
+    for.
+    """
+    # No delay and no descriptor as in the watcher of the file.
+    delay = 0
+    fd = None
+    pending = False
+
+    def __init__(self, path, interval=1.0):
+        self.interval = interval
+        # Connection may be used from different threads but not at once.
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__version = self._version()
+        self.__polled = time.monotonic()
+        self.__retry = False
+        pass
+
+    def check(self):
+        """Check if the schedule was modified."""
+        now = time.monotonic()
+        if self.__retry is False and now - self.__polled < self.interval:
+            return False
+        self.__polled = now
+        version = self._version()
+        if version == self.__version and self.__retry is False:
+            return False
+        self.__version = version
+        self.__retry = False
+        return True
+
+    def retry(self):
+        """Report the modification again on the next check."""
+        self.__retry = True
+        pass
+
+    def close(self):
+        """Stop watching."""
+        self.__connection.close()
+        pass
+
+    def _version(self):
+        """Get the data version of the database."""
+        return self.__connection.execute('PRAGMA data_version').fetchone()[0]
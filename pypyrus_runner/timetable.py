@@ -0,0 +1,399 @@
+import math
+import zlib
+import time
+import datetime
+
+from operator import ne
+from itertools import compress
+
+from .parser import UNIT_SIZE, parse_unit, parse_millisecond
+from .schedule import JobSpec
+from .graph import Graph
+from .limits import Limits
+
+# How many days ahead the nearest run of the job is searched. Covers the
+# rarest combinations of month day and week day.
+HORIZON = 366 * 8
+
+class Timetable():
+    """
+    Compiled schedule that allows to find all jobs for a moment in one pass.
+    Each time unit of each job is compiled once to the bit mask. Then for
+    each unit and each possible base the set of matching jobs is stored as
+    one integer where bit number is a job slot. So scan of the moment is
+    just an intersection of five such sets.
+    Jobs keep their slots between updates, so only changed rows of the
+    schedule are parsed and compiled again.
+    Seconds are divided into steps of the resolution in milliseconds. Each
+    step of the second is one base of the millisecond unit.
+    """
+    # Schedule fields with time units.
+    units = (
+        'month_day', 'week_day', 'hour', 'minute', 'second', 'millisecond')
+    # Number of changed jobs after which the index is rebuilt at once.
+    rebuild = 64
+
+    def __init__(self, header=None, rows=None, resolution=1000):
+        # Milliseconds in one step and number of steps in the second.
+        if (
+            resolution <= 0 or 1000 % resolution != 0
+            or 1000 // resolution > UNIT_SIZE
+        ):
+            raise ValueError(f'incorrect resolution {resolution}.')
+        self.resolution = resolution
+        self.steps = 1000 // resolution
+        # Schedule fields.
+        self.header = None
+        # Raw rows by keys in order of the schedule.
+        self.content = {}
+        # Jobs, raw rows and compiled masks of units for each slot. Free
+        # slots have None records.
+        self.records = []
+        self.rows = []
+        self.masks = []
+        # Counter of modifications of each slot.
+        self.versions = []
+        # Slots of jobs by keys, slots of jobs by ids and free slots.
+        self.slots = {}
+        self.ids = {}
+        self.free = []
+        # Dependencies between jobs.
+        self.graph = Graph()
+        # Set of jobs with active status.
+        self.active = 0
+        # Sets of jobs for each unit and each base.
+        self.index = [[0] * UNIT_SIZE for unit in self.units]
+        self.__cache = {}
+        if header is not None:
+            self.update(header, rows)
+        pass
+
+    def __len__(self):
+        return len(self.slots)
+
+    def update(self, header, rows):
+        """
+        Apply the new content of the schedule. Rows are raw lines by job
+        keys. Returns slots of added, modified and removed jobs.
+        """
+        # Parse all changed rows before anything is modified so the
+        # incomplete schedule is rejected as a whole.
+        # All rows are parsed again if fields were changed.
+        content = self.content
+        # Keys are the same and in the same order when rows are only edited,
+        # so rows are compared pairwise without lookups.
+        same = len(rows) == len(content) and not any(map(ne, rows, content))
+        if header != self.header:
+            changed = list(rows)
+        elif same is True:
+            changed = list(
+                compress(rows, map(ne, rows.values(), content.values())))
+        else:
+            changed = [
+                key for key, row in rows.items() if content.get(key) != row]
+        removed = [] if same is True else [
+            key for key in content if key not in rows]
+        changes = {
+            key: (rows[key], self._parse(header, rows[key], key))
+            for key in changed}
+        # Dependencies are checked only for changed jobs.
+        self.graph.update(
+            [
+                self.records[self.slots[key]] for key in (*removed, *changed)
+                if key in self.slots],
+            [record for row, (record, masks) in changes.values()])
+
+        self.header = header
+        if same is True:
+            content.update((key, rows[key]) for key in changed)
+        else:
+            self.content = dict(rows)
+        # Old masks of modified slots.
+        touched = {}
+        for key in removed:
+            slot = self.slots.pop(key)
+            touched[slot] = self._set(slot, None, None)
+            self.free.append(slot)
+        for key, (row, parsed) in changes.items():
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self._allocate()
+                self.slots[key] = slot
+            touched.setdefault(slot, self._set(slot, row, parsed))
+
+        if len(touched) > self.rebuild:
+            self._rebuild()
+        else:
+            for slot, old in touched.items():
+                self._reindex(slot, old)
+        return list(touched)
+
+    def _parse(self, header, row, key=None):
+        """Parse the raw row to the job and compile its units."""
+        record = JobSpec.parse(header, row, key)
+        if record.jitter is not None and record.jitter.isdigit() is False:
+            raise ValueError(
+                f'incorrect jitter {record.jitter!r} of job {record.id}.')
+        if record.priority not in (None, 'normal', 'critical'):
+            raise ValueError(
+                f'incorrect priority {record.priority!r} of job {record.id}.')
+        Limits.parse(record)
+        # Jobs with dependencies are launched by their upstream jobs, not by
+        # time.
+        if record.depends_on is not None:
+            return (record, (0,) * len(self.units))
+        cache = self.__cache
+        masks = []
+        for name in self.units:
+            unit = getattr(record, name)
+            if name == 'millisecond':
+                # Milliseconds are compiled to steps, not to values.
+                unit = (name, unit)
+            mask = cache.get(unit)
+            if mask is None:
+                if name == 'millisecond':
+                    try:
+                        mask = parse_millisecond(unit[1], self.resolution)
+                    except ValueError as error:
+                        raise ValueError(f'{error} in job {record.id}.')
+                else:
+                    mask = parse_unit(unit)
+                cache[unit] = mask
+            masks.append(mask)
+        return (record, tuple(masks))
+
+    def _allocate(self):
+        """Get the free slot."""
+        if len(self.free) > 0:
+            return self.free.pop()
+        self.records.append(None)
+        self.rows.append(None)
+        self.masks.append((0,) * len(self.units))
+        self.versions.append(0)
+        return len(self.records) - 1
+
+    def _set(self, slot, row, parsed):
+        """Save the parsed record in the slot. Returns old masks."""
+        old = self.masks[slot]
+        if self.records[slot] is not None:
+            slots = self.ids[self.records[slot].id]
+            slots.discard(slot)
+            if len(slots) == 0:
+                self.ids.pop(self.records[slot].id)
+        if parsed is None:
+            self.records[slot] = None
+            self.masks[slot] = (0,) * len(self.units)
+        else:
+            self.records[slot], self.masks[slot] = parsed
+            self.ids.setdefault(self.records[slot].id, set()).add(slot)
+        self.rows[slot] = row
+        self.versions[slot] += 1
+        return old
+
+    def _reindex(self, slot, old):
+        """Update the index for one slot using its old masks."""
+        bit = 1 << slot
+        new = self.masks[slot]
+        for u, index in enumerate(self.index):
+            if old[u] == new[u]:
+                continue
+            for base in self.split(old[u] & ~new[u]):
+                index[base] &= ~bit
+            for base in self.split(new[u] & ~old[u]):
+                index[base] |= bit
+        record = self.records[slot]
+        if record is not None and record.active is True:
+            self.active |= bit
+        else:
+            self.active &= ~bit
+        pass
+
+    def _rebuild(self):
+        """Build the index for all slots at once."""
+        self.active = self._join(
+            slot for slot, record in enumerate(self.records)
+            if record is not None and record.active is True)
+        self.index = [
+            self._index([masks[u] for masks in self.masks])
+            for u in range(len(self.units))]
+        pass
+
+    def scan(self, timestamp, step=0):
+        """
+        Get indexes of active jobs that match the time structure and the
+        step of the second.
+        """
+        month_day, week_day, hour, minute, second, millisecond = self.index
+        jobs = (
+            self.active
+            # Month days in range 1-31.
+            & month_day[timestamp.tm_mday]
+            # Week days in range 1-7.
+            # By default has a range 0-6. Correct it by 1.
+            & week_day[timestamp.tm_wday + 1]
+            # Hours in range 0-23.
+            & hour[timestamp.tm_hour]
+            # Minutes in range 0-59.
+            & minute[timestamp.tm_min]
+            # Seconds in range 0-59.
+            & second[timestamp.tm_sec]
+            # Steps of the second.
+            & millisecond[step])
+        return self.split(jobs)
+
+    def moments(self, start, end, jobs, reverse=False):
+        """
+        Get moments from start till end, excluding the end, with sets of
+        active jobs from the given set that match them. Days, hours and
+        minutes without such jobs are skipped at once. Moments are whole
+        seconds, steps of the second are not used.
+        """
+        jobs &= self.active
+        first = datetime.datetime.fromtimestamp(int(-(-start // 1)))
+        last = datetime.datetime.fromtimestamp(int(-(-end // 1)) - 1)
+        if jobs == 0 or first > last:
+            return
+        month_day, week_day, hour, minute, second, _ = self.index
+        if reverse is True:
+            order = lambda size: range(size - 1, -1, -1)
+        else:
+            order = range
+        days = (last.date() - first.date()).days + 1
+        for n in order(days):
+            day = first.date() + datetime.timedelta(days=n)
+            # Week days in range 1-7 as in the scan.
+            day_jobs = (
+                jobs & month_day[day.day] & week_day[day.isoweekday()])
+            if day_jobs == 0:
+                continue
+            for h in order(24):
+                hour_jobs = day_jobs & hour[h]
+                if hour_jobs == 0:
+                    continue
+                for m in order(60):
+                    minute_jobs = hour_jobs & minute[m]
+                    if minute_jobs == 0:
+                        continue
+                    for s in order(60):
+                        bits = minute_jobs & second[s]
+                        if bits == 0:
+                            continue
+                        found = datetime.datetime.combine(
+                            day, datetime.time(h, m, s))
+                        if first <= found <= last:
+                            yield time.mktime(found.timetuple()), bits
+
+    def next_time(self, i, moment):
+        """
+        Get the nearest moment not earlier than the given one when the job
+        by index must be launched. Returns None if there is no such moment.
+        """
+        month_day, week_day, hour, minute, second, millisecond = self.masks[i]
+        if 0 in self.masks[i]:
+            return None
+        size = self.resolution / 1000
+        whole = math.floor(moment)
+        # Rest of the current second is checked first. Small error of the
+        # float moment does not move it to the next step.
+        step = math.ceil(round((moment - whole) / size, 6))
+        if step > 0:
+            found = self._first(millisecond, step, self.steps)
+            timestamp = time.localtime(whole)
+            if (
+                found is not None
+                and month_day >> timestamp.tm_mday & 1
+                and week_day >> timestamp.tm_wday + 1 & 1
+                and hour >> timestamp.tm_hour & 1
+                and minute >> timestamp.tm_min & 1
+                and second >> timestamp.tm_sec & 1
+            ):
+                return whole + found * size
+            whole += 1
+        offset = self._first(millisecond, 0, self.steps) * size
+        start = datetime.datetime.fromtimestamp(whole)
+        day = start.date()
+        first = (start.hour, start.minute, start.second)
+        for _ in range(HORIZON):
+            # Week days in range 1-7 as in the scan.
+            if (
+                month_day >> day.day & 1
+                and week_day >> day.isoweekday() & 1
+            ):
+                found = self._find_time(hour, minute, second, *first)
+                if found is not None:
+                    found = datetime.datetime.combine(
+                        day, datetime.time(*found))
+                    return time.mktime(found.timetuple()) + offset
+            day += datetime.timedelta(days=1)
+            first = (0, 0, 0)
+        return None
+
+    @staticmethod
+    def offset(spec, jitter=0):
+        """
+        Get the delay of the job launch in seconds within its jitter or the
+        given default jitter. Delay depends only on the job id.
+        """
+        jitter = int(spec.jitter) if spec.jitter is not None else jitter
+        if jitter <= 0:
+            return 0
+        return zlib.crc32(spec.id.encode()) % (jitter + 1)
+
+    @staticmethod
+    def _find_time(hour, minute, second, h, m, s):
+        """Get the first time of the day not earlier than h:m:s."""
+        first = Timetable._first
+        i_hour = first(hour, h, 24)
+        while i_hour is not None:
+            start = m if i_hour == h else 0
+            i_minute = first(minute, start, 60)
+            while i_minute is not None:
+                start = s if i_hour == h and i_minute == m else 0
+                i_second = first(second, start, 60)
+                if i_second is not None:
+                    return (i_hour, i_minute, i_second)
+                i_minute = first(minute, i_minute + 1, 60)
+            i_hour = first(hour, i_hour + 1, 24)
+        return None
+
+    @staticmethod
+    def _first(mask, start, end):
+        """Get the lowest base of the mask in range from start to end."""
+        if start >= end:
+            return None
+        bits = mask >> start & (1 << end - start) - 1
+        if bits == 0:
+            return None
+        return (bits & -bits).bit_length() - 1 + start
+
+    @staticmethod
+    def _index(masks):
+        """Get the set of jobs for each base from the job masks."""
+        # Group jobs by mask. Schedules usually have only a few distinct
+        # masks in each unit so index is built over groups, not over jobs.
+        groups = {}
+        for i, mask in enumerate(masks):
+            groups.setdefault(mask, []).append(i)
+        groups = {
+            mask: Timetable._join(jobs) for mask, jobs in groups.items()}
+        index = [0] * UNIT_SIZE
+        for mask, jobs in groups.items():
+            for base in Timetable.split(mask):
+                index[base] |= jobs
+        return index
+
+    @staticmethod
+    def _join(indexes):
+        """Convert indexes to the set of bits."""
+        bits = 0
+        for i in indexes:
+            bits |= 1 << i
+        return bits
+
+    @staticmethod
+    def split(bits):
+        """Convert the set of bits to job indexes."""
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
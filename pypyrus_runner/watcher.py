@@ -0,0 +1,172 @@
+import os
+import time
+import struct
+import ctypes
+import ctypes.util
+
+# Inotify flags.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# Header of the inotify event: watch, mask, cookie and length of the name.
+EVENT = struct.Struct('iIII')
+# Events of the watched file and of its folder while the file is missing.
+# File replaced by the new one changes its number of links or is deleted,
+# so the new file is watched then.
+FILE_EVENTS = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF)
+FOLDER_EVENTS = IN_CREATE | IN_MOVED_TO
+RENEW_EVENTS = IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+class Watcher():
+    """
+    Class describing the watcher of the file modifications.
+    On Linux the file is watched with inotify, so other files of its folder
+    written by the scheduler do not wake it. Folder is watched only while
+    the file does not exist. On other systems the file is checked with
+    os.stat not more often than once per interval.
+    Modification is reported only when the file stays unchanged for the
+    delay, so partially written file is not picked up.
+    """
+    def __init__(self, path, interval=1.0, delay=1.0):
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.delay = delay
+        # Time of the last noticed modification that was not reported yet.
+        self.__touched = None
+        # Signature of the file when it was reported last time.
+        self.__loaded = self._stat()
+        # Signature and time of the last poll.
+        self.__seen = self.__loaded
+        self.__polled = time.monotonic()
+        # Watch of inotify and if it is the watch of the folder.
+        self.__libc = None
+        self.__wd = None
+        self.__folder = False
+        self.__fd = self._watch()
+        pass
+
+    @property
+    def pending(self):
+        """Check if the modification was noticed but not reported yet."""
+        return self.__touched is not None
+
+    @property
+    def fd(self):
+        """Descriptor of inotify or None if it is not used."""
+        return self.__fd
+
+    def check(self):
+        """Check if the file was modified and is ready to be read."""
+        now = time.monotonic()
+        if self._events(now) is True:
+            self.__touched = now
+        if self.__touched is None or now - self.__touched < self.delay:
+            return False
+        self.__touched = None
+        signature = self._stat()
+        if signature == self.__loaded:
+            return False
+        self.__loaded = signature
+        return True
+
+    def retry(self):
+        """Report the modification again after the delay."""
+        self.__loaded = None
+        self.__touched = time.monotonic()
+        pass
+
+    def close(self):
+        """Stop watching."""
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+        pass
+
+    def _stat(self):
+        """Get the signature of the file."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _watch(self):
+        """Start watching the file with inotify if it is available."""
+        if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            self.__libc = libc
+            if self._renew(fd) is False:
+                os.close(fd)
+                return None
+        except (OSError, AttributeError):
+            return None
+        return fd
+
+    def _renew(self, fd):
+        """
+        Watch the current file or its folder if the file does not exist.
+        Previous watch is removed if it was not of the same file.
+        """
+        libc = self.__libc
+        wd = libc.inotify_add_watch(fd, self.path.encode(), FILE_EVENTS)
+        folder = wd < 0
+        if folder is True:
+            wd = libc.inotify_add_watch(
+                fd, os.path.dirname(self.path).encode(), FOLDER_EVENTS)
+        if self.__wd is not None and self.__wd != wd:
+            libc.inotify_rm_watch(fd, self.__wd)
+        self.__wd = wd if wd >= 0 else None
+        self.__folder = folder
+        return wd >= 0
+
+    def _events(self, now):
+        """Check if there were new modifications of the file."""
+        if self.__fd is not None:
+            name = os.path.basename(self.path).encode()
+            found = renew = False
+            while True:
+                try:
+                    data = os.read(self.__fd, 65536)
+                except BlockingIOError:
+                    break
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, length = EVENT.unpack_from(data, offset)
+                    offset += EVENT.size
+                    event = data[offset:offset + length].rstrip(b'\0')
+                    offset += length
+                    # Events of removed watches are late.
+                    if wd != self.__wd:
+                        continue
+                    if self.__folder is True:
+                        if event == name:
+                            found = renew = True
+                    else:
+                        found = True
+                        if mask & RENEW_EVENTS:
+                            renew = True
+            if renew is True:
+                self._renew(self.__fd)
+            return found
+        else:
+            if now - self.__polled < self.interval:
+                return False
+            self.__polled = now
+            signature = self._stat()
+            if signature != self.__seen:
+                self.__seen = signature
+                return True
+            return False
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import queue
+import runpy
+import itertools
+import threading
+import traceback
+import subprocess
+
+from types import SimpleNamespace
+
+from .registry import wait
+from .limits import Limits
+
+# Code starting the worker. Imports of the runner warm up the worker with all
+# modules used by jobs.
+STARTER = (
+    'import sys, pypyrus_runner.workers as workers; '
+    'sys.exit(workers.main(int(sys.argv[1]), int(sys.argv[2])))')
+
+class Worker():
+    """
+    Class describing one warm Python process.
+    Worker is started once with all runner modules imported. Each job run is
+    a fork of the worker so the run is isolated but skips the interpreter
+    startup. Requests and replies are lines of JSON in the pair of pipes.
+    """
+    def __init__(self, executor):
+        requests_read, requests_write = os.pipe()
+        replies_read, replies_write = os.pipe()
+        command = [
+            executor, '-c', STARTER, str(requests_read), str(replies_write)]
+        fds = (requests_read, replies_write)
+        self.process = subprocess.Popen(command, pass_fds=fds)
+        os.close(requests_read)
+        os.close(replies_write)
+        self.requests = os.fdopen(requests_write, 'w', buffering=1)
+        self.replies = os.fdopen(replies_read, 'r')
+        pass
+
+    def send(self, request):
+        """Send the request to the worker."""
+        self.requests.write(json.dumps(request) + '\n')
+        pass
+
+    def receive(self):
+        """Get the next reply from the worker or None if it is closed."""
+        line = self.replies.readline()
+        return json.loads(line) if line else None
+
+class Workers():
+    """
+    Class describing the pool of warm Python workers.
+    Pool has the same interface as the launcher. Requests are distributed
+    between workers in turn. Results of each worker are read in the
+    separate thread.
+    """
+    def __init__(self, executor, size=1, callback=None, finish=None):
+        self.executor = executor
+        self.results = queue.Queue()
+        # Function called right after the spawn.
+        self.callback = callback
+        # Function called with process id, exit code and used resources
+        # when the run is finished.
+        self.finish = finish
+        # Processes waiting for the spawn by tokens.
+        self.requested = {}
+        self.lock = threading.Lock()
+        self.__tokens = itertools.count()
+        self.__workers = [self._start() for i in range(size)]
+        self.__order = itertools.cycle(range(size))
+        pass
+
+    def launch(self, process):
+        """Request the process to be created by one of workers."""
+        i = next(self.__order)
+        worker = self.__workers[i]
+        # Restart the worker if it was stopped.
+        if worker.process.poll() is not None:
+            worker = self.__workers[i] = self._start()
+        token = next(self.__tokens)
+        path = os.path.abspath(process.file)
+        argv = [path]
+        if process.parameters is not None:
+            argv.extend(process.parameters.split())
+        cpu = process.limits.cpu if process.limits is not None else None
+        with self.lock:
+            self.requested[token] = process
+        try:
+            worker.send({
+                'token': token,
+                'cwd': os.path.dirname(path),
+                'argv': argv,
+                'env': process.env,
+                'cpu': cpu})
+        except BaseException:
+            # Request never reached the worker so no result will come.
+            with self.lock:
+                self.requested.pop(token, None)
+            raise
+        return process
+
+    def collect(self):
+        """Get all processes handled since the last call."""
+        processes = []
+        while True:
+            try:
+                processes.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        return processes
+
+    def _start(self):
+        """Start the worker and the thread reading its replies."""
+        worker = Worker(self.executor)
+        thread = threading.Thread(
+            target=self._read, args=(worker,), name='worker', daemon=True)
+        thread.start()
+        return worker
+
+    def _read(self, worker):
+        """Handle replies of the worker in the loop."""
+        while True:
+            reply = worker.receive()
+            if reply is None:
+                break
+            if 'pid' in reply and 'exit_code' not in reply:
+                with self.lock:
+                    process = self.requested.pop(reply['token'])
+                process.pid = reply['pid']
+                process.child = False
+                process.latency = time.monotonic() - process.requested
+                try:
+                    if self.callback is not None:
+                        self.callback(process)
+                except BaseException as error:
+                    process.error = error
+                self.results.put(process)
+            elif 'error' in reply:
+                with self.lock:
+                    process = self.requested.pop(reply['token'])
+                process.error = RuntimeError(reply['error'])
+                self.results.put(process)
+            elif self.finish is not None:
+                rusage = SimpleNamespace(
+                    ru_maxrss=reply['max_rss'],
+                    ru_utime=reply['user_time'],
+                    ru_stime=reply['system_time'])
+                self.finish(reply['pid'], reply['exit_code'], rusage)
+        pass
+
+def main(requests, replies):
+    """
+    Main loop of the worker process. Fork the job run for each request and
+    report its process id and then its exit code.
+    Returns the exit code in the forked run.
+    """
+    requests = os.fdopen(requests, 'r')
+    lock = threading.Lock()
+
+    def reply(message):
+        with lock:
+            os.write(replies, (json.dumps(message) + '\n').encode())
+        pass
+
+    def finish(token, pid):
+        exit_code, rusage = wait(pid)
+        reply({
+            'token': token, 'pid': pid, 'exit_code': exit_code,
+            'max_rss': rusage.ru_maxrss,
+            'user_time': rusage.ru_utime,
+            'system_time': rusage.ru_stime})
+        pass
+
+    for line in requests:
+        request = json.loads(line)
+        token = request['token']
+        try:
+            pid = os.fork()
+        except BaseException as error:
+            reply({'token': token, 'error': repr(error)})
+            continue
+        if pid == 0:
+            requests.close()
+            os.close(replies)
+            return run(request)
+        reply({'token': token, 'pid': pid})
+        threading.Thread(
+            target=finish, args=(token, pid), daemon=True).start()
+    return 0
+
+def run(request):
+    """Execute the job file as the main script in the forked process."""
+    cwd = request['cwd']
+    argv = request['argv']
+    Limits(cpu=request.get('cpu')).apply()
+    os.chdir(cwd)
+    os.environ.update(request['env'])
+    sys.argv = argv
+    sys.path[0] = cwd
+    try:
+        runpy.run_path(argv[0], run_name='__main__')
+    except SystemExit as error:
+        return error.code
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    return 0